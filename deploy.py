@@ -25,11 +25,16 @@
 #      See https://cloud.google.com/sdk/docs/install.
 #   b) A cloud billing account is set for the given project.
 #      See https://cloud.google.com/billing/docs/how-to/modify-project
+import concurrent.futures
+import functools
 import getopt
+import json
+import os
 import subprocess
 import sys
+import tempfile
 import time
-from typing import List, Optional, Set, Text
+from typing import AbstractSet, Any, Dict, List, Text
 
 _HELP_INFO = (
     'Please run the deploy command as the following: \npython3 deploy.py -p'
@@ -42,97 +47,254 @@ _HELP_INFO = (
     ' "python3 deploy.py -h" to see this help information.'
 )
 
+# The Google Cloud services to enable before triggering the Cloud Build.
+_REQUIRED_SERVICES = [
+    'cloudbuild.googleapis.com',
+    'cloudresourcemanager.googleapis.com',
+    'serviceusage.googleapis.com',
+    'compute.googleapis.com',
+]
+
+# The roles the Cloud Build service account needs to run the Terraform
+# scripts. They are granted here rather than in Terraform, since Terraform runs
+# as this very service account.
+_CLOUD_BUILD_SA_ROLES = frozenset(
+    ['roles/editor', 'roles/iam.securityAdmin', 'roles/run.admin']
+)
 
-def _RunGcloudCommand(
-    cmd: Text, err_msg: Text, wait_before_return_sec: int = 0
+# The initial and the maximum delays, in seconds, between two polls of a
+# long-running gcloud operation, and how long to poll before giving up.
+_OPERATION_POLL_INITIAL_DELAY_SEC = 0.05
+_OPERATION_POLL_MAX_DELAY_SEC = 1.0
+_OPERATION_POLL_TIMEOUT_SEC = 600
+
+# The initial and the maximum delays, in seconds, between two polls of the
+# Cloud Build status, and how long to wait for the build before giving up.
+_BUILD_POLL_INITIAL_DELAY_SEC = 5
+_BUILD_POLL_MAX_DELAY_SEC = 30
+_BUILD_POLL_TIMEOUT_SEC = 3600
+
+# The statuses of a Cloud Build that has stopped running. See
+# https://cloud.google.com/build/docs/api/reference/rest/v1/projects.builds#status
+_BUILD_FINAL_STATUSES = frozenset([
+    'SUCCESS',
+    'FAILURE',
+    'INTERNAL_ERROR',
+    'TIMEOUT',
+    'CANCELLED',
+    'EXPIRED',
+])
+
+# The name template of the GCS bucket that holds the Terraform remote state.
+_TF_STATE_BUCKET_TEMPLATE = '{project_id}-tfstate'
+
+# The substitutions passed to the Cloud Build run of cloudbuild.yaml.
+_CLOUD_BUILD_SUBSTITUTIONS_TEMPLATE = (
+    'BRANCH_NAME={branch},_DRY_RUN={dry_run},'
+    '_CONFIG_SERVER_TYPE={config_server_type}'
+)
+
+
+def _StartGcloudCommand(cmd: List[Text]) -> subprocess.Popen:
+  """Starts the given gcloud command without waiting for it to complete.
+
+  The command is executed directly rather than through a shell, which saves
+  spawning a /bin/sh process per command and avoids any shell quoting issues.
+  Independent commands can be started one after another and run concurrently.
+
+  Args:
+    cmd: Gcloud command to run, as a list of program arguments.
+
+  Returns:
+    A subprocess.Popen instance of the running command.
+  """
+  return subprocess.Popen(
+      cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+  )
+
+
+def _WaitForGcloudCommand(
+    process: subprocess.Popen, err_msg: Text, print_success: bool = True
 ) -> subprocess.CompletedProcess:
-  """Runs the given gcloud command and outputs the error message if failed.
+  """Waits for a started gcloud command and outputs the error message if failed.
 
   Args:
-    cmd: Gcloud command to run.
+    process: The process of the command, as returned by _StartGcloudCommand.
     err_msg: The error message to print if the execution fails.
-    wait_before_return_sec: How long it waits after completing the command, in
-      seconds. This is to ensure the excution result is populated.
+    print_success: Whether to print a message if the execution succeeds. It is
+      turned off for the commands that are run repeatedly to poll a status.
 
   Returns:
     A subprocess.CompletedProcess instance with the execution result.
   Raises:
     Any Exception raised during the command run.
   """
+  cmd = process.args
   try:
+    stdout, stderr = process.communicate()
     # If the exit code is non-zero, it will fail.
-    result = subprocess.run(
-        cmd, shell=True, capture_output=True, text=True, check=True
+    result = subprocess.CompletedProcess(
+        cmd, process.returncode, stdout, stderr
     )
-    if wait_before_return_sec > 0:
-      time.sleep(wait_before_return_sec)
+    result.check_returncode()
   except subprocess.CalledProcessError as e:
     print(err_msg)
     print(e.output)
     print(e.stderr)
     raise
   except BaseException as e:
+    process.kill()
     print(err_msg)
     print('Exception raised {}'.format(e))
     raise
   else:
-    print('Sucessfully completed the command: {}'.format(cmd))
+    if print_success:
+      print('Successfully completed the command: {}'.format(' '.join(cmd)))
     return result
 
 
+def _RunGcloudCommand(
+    cmd: List[Text], err_msg: Text, print_success: bool = True
+) -> subprocess.CompletedProcess:
+  """Runs the given gcloud command and outputs the error message if failed.
+
+  Args:
+    cmd: Gcloud command to run, as a list of program arguments.
+    err_msg: The error message to print if the execution fails.
+    print_success: Whether to print a message if the execution succeeds.
+
+  Returns:
+    A subprocess.CompletedProcess instance with the execution result.
+  Raises:
+    Any Exception raised during the command run.
+  """
+  try:
+    process = _StartGcloudCommand(cmd)
+  except BaseException as e:
+    print(err_msg)
+    print('Exception raised {}'.format(e))
+    raise
+  return _WaitForGcloudCommand(process, err_msg, print_success)
+
+
 def _SetProjectForInvocation(project_id: Text):
   """Sets the given project ID as the one to use for this invocation."""
-  gcloud_cmd = 'gcloud config set project {project}'.format(project=project_id)
+  gcloud_cmd = ['gcloud', 'config', 'set', 'project', project_id]
   err_msg = 'Failed to set the project ID for this invocation: {}'.format(
       project_id
   )
   _RunGcloudCommand(gcloud_cmd, err_msg)
 
 
-def _EnableCloudBuildService(project_id: Text):
-  """Enables the Google Cloud Build service."""
-  gcloud_cmd = 'gcloud services enable cloudbuild.googleapis.com'
-  err_msg = (
-      'Failed to enable the Cloud Build service for the project: {}'.format(
-          project_id
-      )
-  )
-  _RunGcloudCommand(gcloud_cmd, err_msg)
+def _WaitForServiceOperation(operation_name: Text):
+  """Polls a Service Usage operation until it is done.
 
+  The delay between two polls starts at _OPERATION_POLL_INITIAL_DELAY_SEC and
+  doubles after each poll, capped at _OPERATION_POLL_MAX_DELAY_SEC.
 
-def _EnableCloudResourceManagerService(project_id: Text):
-  """Enables the Google Cloud Resource Manager serive."""
-  gcloud_cmd = 'gcloud services enable cloudresourcemanager.googleapis.com'
-  err_msg = (
-      'Failed to enable the Cloud Resource Manager service for the project: {}'
-  ).format(project_id)
-  _RunGcloudCommand(gcloud_cmd, err_msg, wait_before_return_sec=5)
+  Args:
+    operation_name: The name of the operation returned by gcloud, e.g.
+      "operations/acf.p2-123-456".
 
+  Raises:
+    RuntimeError: If the operation is done with an error, e.g. billing is not
+      enabled for the project.
+    TimeoutError: If the operation is not done within
+      _OPERATION_POLL_TIMEOUT_SEC seconds.
+  """
+  gcloud_cmd = [
+      'gcloud',
+      'services',
+      'operations',
+      'describe',
+      operation_name,
+      '--format',
+      'json',
+  ]
+  err_msg = 'Failed to get the status of the operation {}'.format(
+      operation_name
+  )
+  delay_sec = _OPERATION_POLL_INITIAL_DELAY_SEC
+  deadline = time.monotonic() + _OPERATION_POLL_TIMEOUT_SEC
+  while True:
+    operation = json.loads(
+        _RunGcloudCommand(gcloud_cmd, err_msg, print_success=False).stdout
+    )
+    if operation.get('done'):
+      error = operation.get('error')
+      if error:
+        raise RuntimeError(
+            'The operation {} failed: {}'.format(
+                operation_name, error.get('message', error)
+            )
+        )
+      print('Successfully completed the operation: {}'.format(operation_name))
+      return
+    if time.monotonic() >= deadline:
+      raise TimeoutError(
+          'The operation {} is not done after {} seconds'.format(
+              operation_name, _OPERATION_POLL_TIMEOUT_SEC
+          )
+      )
+    time.sleep(delay_sec)
+    delay_sec = min(delay_sec * 2, _OPERATION_POLL_MAX_DELAY_SEC)
 
-def _EnableCloudServiceUsageService(project_id: Text):
-  """Enables the Google Cloud Service Usage serive."""
-  gcloud_cmd = 'gcloud services enable serviceusage.googleapis.com'
-  err_msg = (
-      'Failed to enable the Cloud Service Usage service for the project: {}'
-  ).format(project_id)
-  _RunGcloudCommand(gcloud_cmd, err_msg, wait_before_return_sec=5)
 
+def _EnableServices(project_id: Text, services: List[Text]):
+  """Enables the given Google Cloud services with a single gcloud command.
 
-def _EnableComputeEngineService(project_id: Text):
-  """Enables the Google Cloud Compute Engine serive."""
-  gcloud_cmd = 'gcloud services enable compute.googleapis.com'
+  The services are enabled asynchronously and the returned operation is polled
+  until it is done, instead of sleeping for a fixed amount of time.
+  """
+  gcloud_cmd = (
+      ['gcloud', 'services', 'enable']
+      + services
+      + ['--async', '--format', 'value(name)']
+  )
   err_msg = (
-      'Failed to enable the Cloud Compute Engine service for the project: {}'
-  ).format(project_id)
-  # Enabling the compute engine service takes time, so wait for 15 seconds.
-  _RunGcloudCommand(gcloud_cmd, err_msg, wait_before_return_sec=15)
+      'Failed to enable the services {services} for the project: {project}'
+  ).format(services=services, project=project_id)
+  result = _RunGcloudCommand(gcloud_cmd, err_msg)
+  # No operation name is returned if all the services are already enabled.
+  operation_name = result.stdout.strip()
+  if operation_name:
+    _WaitForServiceOperation(operation_name)
 
 
+@functools.lru_cache(maxsize=None)
 def _GetProjectNumberFromId(project_id: Text) -> Text:
-  """Converts a project Id into its project number."""
-  gcloud_cmd = (
-      'gcloud projects describe {project} --format "value(projectNumber)"'
-  ).format(project=project_id)
+  """Converts a project Id into its project number.
+
+  The result is cached so the project is described at most once per run. If the
+  env. variable GOOGLE_CLOUD_PROJECT_NUMBER is set and the env. variable
+  GOOGLE_CLOUD_PROJECT names the same project, the number is returned directly
+  without running any gcloud command.
+  """
+  project_number = os.getenv('GOOGLE_CLOUD_PROJECT_NUMBER')
+  if project_number:
+    # The number is only trusted for the project it was set for, so that a
+    # stale value never grants roles in another project.
+    if os.getenv('GOOGLE_CLOUD_PROJECT') == project_id:
+      print(
+          'Using the project number {} of the project {} from the env.'
+          ' variable GOOGLE_CLOUD_PROJECT_NUMBER'.format(
+              project_number, project_id
+          )
+      )
+      return project_number
+    print(
+        'Ignoring the env. variable GOOGLE_CLOUD_PROJECT_NUMBER because'
+        ' GOOGLE_CLOUD_PROJECT is not set to the project {}'.format(project_id)
+    )
+
+  gcloud_cmd = [
+      'gcloud',
+      'projects',
+      'describe',
+      project_id,
+      '--format',
+      'value(projectNumber)',
+  ]
   err_msg = 'Failed to get the project number of the project {}'.format(
       project_id
   )
@@ -140,40 +302,107 @@ def _GetProjectNumberFromId(project_id: Text) -> Text:
   return result.stdout.strip()
 
 
-def _GrantRolesToCloudBuildSa(project_id: Text, roles: Set[Text]):
-  """Grants roles to the default Cloud Build service account."""
-  project_number = _GetProjectNumberFromId(project_id)
+def _AddIamBindings(
+    policy: Dict[Text, Any], member: Text, roles: AbstractSet[Text]
+) -> Dict[Text, Any]:
+  """Adds the member to the bindings of the given roles in an IAM policy."""
+  bindings = policy.setdefault('bindings', [])
+  role_to_binding = {
+      binding['role']: binding
+      for binding in bindings
+      if 'condition' not in binding
+  }
+  for role in sorted(roles):
+    binding = role_to_binding.get(role)
+    if binding is None:
+      binding = {'role': role, 'members': []}
+      bindings.append(binding)
+      role_to_binding[role] = binding
+    if member not in binding['members']:
+      binding['members'].append(member)
+  return policy
+
+
+def _GrantRolesToCloudBuildSa(project_id: Text, roles: AbstractSet[Text]):
+  """Grants roles to the default Cloud Build service account.
+
+  All the roles are granted with a single read-modify-write of the project IAM
+  policy. The etag read with the policy is written back with it, so the update
+  fails instead of overwriting any concurrent change to the policy.
+  """
+  # Reading the IAM policy does not depend on the project number, so start it
+  # first and let it run while the project number is looked up.
+  gcloud_cmd = [
+      'gcloud',
+      'projects',
+      'get-iam-policy',
+      project_id,
+      '--format',
+      'json',
+  ]
+  err_msg = 'Failed to get the IAM policy of the project {}'.format(project_id)
+  get_policy_process = _StartGcloudCommand(gcloud_cmd)
+
+  try:
+    project_number = _GetProjectNumberFromId(project_id)
+  except BaseException:
+    get_policy_process.kill()
+    get_policy_process.communicate()
+    raise
   cloudbuild_sa = '{project_number}@cloudbuild.gserviceaccount.com'.format(
       project_number=project_number
   )
 
-  for role in roles:
-    gcloud_cmd = (
-        'gcloud projects add-iam-policy-binding {project_id} --member '
-        'serviceAccount:{cloudbuild} --role {role}'
-    ).format(project_id=project_id, cloudbuild=cloudbuild_sa, role=role)
+  result = _WaitForGcloudCommand(get_policy_process, err_msg)
+  policy = _AddIamBindings(
+      json.loads(result.stdout),
+      'serviceAccount:{}'.format(cloudbuild_sa),
+      roles,
+  )
+
+  policy_fd, policy_file_name = tempfile.mkstemp(suffix='.json')
+  # The file is removed even if writing the policy into it fails.
+  try:
+    with os.fdopen(policy_fd, 'w') as policy_file:
+      json.dump(policy, policy_file)
+    gcloud_cmd = [
+        'gcloud',
+        'projects',
+        'set-iam-policy',
+        project_id,
+        policy_file_name,
+        '--format',
+        'none',
+    ]
     err_msg = (
-        'Failed to grant role {role} to the Cloud Build service account '
+        'Failed to grant roles {roles} to the Cloud Build service account '
         '{cloudbuild_sa}'
-    ).format(role=role, cloudbuild_sa=cloudbuild_sa)
+    ).format(roles=sorted(roles), cloudbuild_sa=cloudbuild_sa)
     _RunGcloudCommand(gcloud_cmd, err_msg)
+  finally:
+    os.remove(policy_file_name)
 
 
 def _SetupTfRemoteState(project_id: Text):
   """Setups a GCS bucket to store Terraform states remotely."""
   # Create a GCS bucket with the name of "<project_id>-tfstate".
-  gcs_bucket_name = '{project_id}-tfstate'.format(project_id=project_id)
-  gcloud_cmd = 'gsutil mb gs://{gcs_bucket_name}'.format(
-      gcs_bucket_name=gcs_bucket_name
+  gcs_bucket_name = _TF_STATE_BUCKET_TEMPLATE.format_map(
+      {'project_id': project_id}
   )
+  gcs_bucket_url = 'gs://' + gcs_bucket_name
+  gcloud_cmd = ['gsutil', 'mb', gcs_bucket_url]
   err_msg = 'Failed to create the GCS bucket {gcs_bucket_name}'.format(
       gcs_bucket_name=gcs_bucket_name
   )
   _RunGcloudCommand(gcloud_cmd, err_msg)
   # Enable the versioning of the GCS bucket.
-  gcloud_cmd = 'gsutil versioning set on gs://{gcs_bucket_name}'.format(
-      gcs_bucket_name=gcs_bucket_name
-  )
+  gcloud_cmd = [
+      'gsutil',
+      'versioning',
+      'set',
+      'on',
+      gcs_bucket_url,
+  ]
   err_msg = (
       'Failed to enable versioning of the GCS bucket {gcs_bucket_name}'
   ).format(gcs_bucket_name=gcs_bucket_name)
@@ -182,30 +411,101 @@ def _SetupTfRemoteState(project_id: Text):
 
 def _TriggerCloudBuild(
     branch: Text, dry_run: bool = False, config_server_type: Text = 'in-memory'
-):
-  """Triggers the Cloud Build to run the local cloudbuild.yaml file."""
+) -> Text:
+  """Triggers the Cloud Build to run the local cloudbuild.yaml file.
+
+  The build is submitted asynchronously, see _WaitForCloudBuild to wait for
+  its completion.
+
+  Returns:
+    The ID of the triggered build.
+  """
   # The config_server_type can be in-memory or gcs. If it is set to gcs, don't forget to create
   # a GCS bucket naming 'gcs_config_bucket_{project_id}' and upload the config file config_params.json
   # to the bucket before running the script. You also need to grant read permission to the Cloud Run
   # default service account PROJECT_NUMBER-compute@developer.gserviceaccount.com, see
   # https://cloud.google.com/run/docs/configuring/service-accounts.
-  gcloud_cmd = (
-      'gcloud builds submit . --config cloudbuild.yaml '
-      '--substitutions'
-      ' BRANCH_NAME={branch},_DRY_RUN={dry_run},_CONFIG_SERVER_TYPE={config_server_type}'
-  ).format(
-      branch=branch, dry_run=dry_run, config_server_type=config_server_type
-  )
+  gcloud_cmd = [
+      'gcloud',
+      'builds',
+      'submit',
+      '.',
+      '--config',
+      'cloudbuild.yaml',
+      '--substitutions',
+      _CLOUD_BUILD_SUBSTITUTIONS_TEMPLATE.format_map({
+          'branch': branch,
+          'dry_run': dry_run,
+          'config_server_type': config_server_type,
+      }),
+      '--async',
+      '--format',
+      'value(id)',
+  ]
 
   err_msg = 'Failed to trigger the cloud build for cloudbuild.yaml'
-  _RunGcloudCommand(gcloud_cmd, err_msg)
+  result = _RunGcloudCommand(gcloud_cmd, err_msg)
+  return result.stdout.strip()
+
+
+def _WaitForCloudBuild(build_id: Text):
+  """Polls the given Cloud Build until it stops running.
+
+  The delay between two polls starts at _BUILD_POLL_INITIAL_DELAY_SEC and
+  doubles after each poll, capped at _BUILD_POLL_MAX_DELAY_SEC.
+
+  Args:
+    build_id: The ID of the build returned by _TriggerCloudBuild.
+
+  Raises:
+    RuntimeError: If the build does not succeed.
+    TimeoutError: If the build is still running after _BUILD_POLL_TIMEOUT_SEC
+      seconds.
+  """
+  gcloud_cmd = [
+      'gcloud',
+      'builds',
+      'describe',
+      build_id,
+      '--format',
+      'value(status)',
+  ]
+  err_msg = 'Failed to get the status of the cloud build {}'.format(build_id)
+  delay_sec = _BUILD_POLL_INITIAL_DELAY_SEC
+  deadline = time.monotonic() + _BUILD_POLL_TIMEOUT_SEC
+  while True:
+    status = _RunGcloudCommand(
+        gcloud_cmd, err_msg, print_success=False
+    ).stdout.strip()
+    if status == 'SUCCESS':
+      print('Successfully completed the cloud build: {}'.format(build_id))
+      return
+    if status in _BUILD_FINAL_STATUSES:
+      raise RuntimeError(
+          'The cloud build {} finished with the status {}'.format(
+              build_id, status
+          )
+      )
+    if time.monotonic() >= deadline:
+      raise TimeoutError(
+          'The cloud build {} is not done after {} seconds'.format(
+              build_id, _BUILD_POLL_TIMEOUT_SEC
+          )
+      )
+    time.sleep(delay_sec)
+    delay_sec = min(delay_sec * 2, _BUILD_POLL_MAX_DELAY_SEC)
 
 
 def _CreateVmInstance(project_id: Text, vm_name: Text, zone: Text):
   """Creates a VM instance."""
-  gcloud_cmd = 'gcloud compute instances create {vm_name} --zone={zone}'.format(
-      vm_name=vm_name, zone=zone
-  )
+  gcloud_cmd = [
+      'gcloud',
+      'compute',
+      'instances',
+      'create',
+      vm_name,
+      '--zone={}'.format(zone),
+  ]
   err_msg = 'Failed to create a VM instance in {}'.format(zone)
   _RunGcloudCommand(gcloud_cmd, err_msg)
 
@@ -256,50 +556,56 @@ def main(argv: List[Text]):
   )
   _SetProjectForInvocation(project_id)
 
-  # Enable the Cloud Build Service, which is needed to trigger Cloud Build.
-  print('---- Step 2: Enable the Cloud Build Service')
-  _EnableCloudBuildService(project_id)
-
-  # Enable the Google Cloud Resource Manager serive, which is needed to manage
-  # resources in Terraform.
-  print('---- Step 3: Enable the Cloud Resource Manager Service')
-  _EnableCloudResourceManagerService(project_id)
+  # Enable all the services used by the deployment in one batch:
+  # - Cloud Build, which is needed to trigger Cloud Build.
+  # - Cloud Resource Manager, which is needed to manage resources in Terraform.
+  # - Cloud Service Usage, which is needed to enable/disable services in
+  #   Terraform.
+  # - Compute Engine, which is needed to create the VM instance in Step 6.
+  #
+  # Enabling the services takes the longest, so it runs in the background while
+  # the steps that do not depend on them run: the GCS bucket creation and the
+  # project number lookup, which is cached for Step 4.
+  print('---- Step 2: Enable the required Google Cloud services')
+  with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+    enable_services_future = executor.submit(
+        _EnableServices, project_id, _REQUIRED_SERVICES
+    )
 
-  # Enable the Google Cloud Service Usage serive, which is needed to
-  # enable/disable services in Terraform.
-  print('---- Step 4: Enable the Cloud Service Usage Service')
-  _EnableCloudServiceUsageService(project_id)
+    # Setups the GCS bucket for Terraform to save states remotely.
+    print(
+        '---- Step 3: Set up a GCS bucket for Terraform to save states remotely'
+    )
+    _SetupTfRemoteState(project_id)
+    _GetProjectNumberFromId(project_id)
+    enable_services_future.result()
 
   # Grants necessary roles to the cloud build SA so it can run Terraform scripts.
-  print('---- Step 5: Grant the Cloud Run service account necessary roles')
-  cloud_build_sa_roles = set(
-      ['roles/editor', 'roles/iam.securityAdmin', 'roles/run.admin']
-  )
-  _GrantRolesToCloudBuildSa(project_id, cloud_build_sa_roles)
-
-  # Setups the GCS bucket for Terraform to save states remotely.
-  print(
-      '---- Step 6: Set up a GCS bucket for Terraform to save states remotely'
-  )
-  _SetupTfRemoteState(project_id)
+  print('---- Step 4: Grant the Cloud Run service account necessary roles')
+  _GrantRolesToCloudBuildSa(project_id, _CLOUD_BUILD_SA_ROLES)
 
   # Manully trigger the Cloud Build.
   print(
-      '---- Step 7: Manually trigger the Cloud Build: branch={},'
+      '---- Step 5: Manually trigger the Cloud Build: branch={},'
       ' config_server_type={}'.format(branch, config_server_type)
   )
-  _TriggerCloudBuild(branch, config_server_type=config_server_type)
+  build_id = _TriggerCloudBuild(branch, config_server_type=config_server_type)
 
   # Optional: Create a VM instance to trigger the alerting polices created with Terraform.
   # If you don't want to automatically trigger the created alert policies, you can remove
   # this step.
-  print('---- Step 8: Create a VM instance to trigger alert polices')
-  print('----   Step 8.1: Enable the Compute Engine service')
-  _EnableComputeEngineService(project_id)
-  print('----   Step 8.2: Create a VM instance')
+  # The VM does not depend on the build, so it is created while the build runs.
+  print('---- Step 6: Create a VM instance to trigger alert polices')
   vm_name = 'cloud-alerting-test-vm'
   zone = 'us-east1-b'
-  _CreateVmInstance(project_id, vm_name, zone)
+  with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+    vm_future = executor.submit(_CreateVmInstance, project_id, vm_name, zone)
+    print(
+        '---- Waiting for the Cloud Build {build_id} to finish, see its logs'
+        ' with: gcloud builds log --stream {build_id}'.format(build_id=build_id)
+    )
+    _WaitForCloudBuild(build_id)
+    vm_future.result()
   print(
       '**** Congratulations, you successfully finished the cloud alerting'
       ' integration demo setup, please wait for your first alerting'
@@ -32,15 +32,15 @@ client = google.cloud.logging.Client()
 client.setup_logging()
 
 import logging
-import json
-import sys
 import os
+import threading
+import time
+from typing import Optional
 
 from flask import Flask, request
+from werkzeug import exceptions
 
-from httplib2 import Http
-
-from utilities import config_server, pubsub, service_handler
+from utilities import config_server, fast_json, pubsub, service_handler
 
 
 # The keys of the config_map corresponds to the local pubsub topic
@@ -74,26 +74,95 @@ config_map = {
 # If you want to use the GCS config file, don't forget to manually create the GCS
 # bucket and upload the config file to the bucket before running the deployment
 # script.
-config_params_server = config_server.InMemoryConfigServer(config_map)
-config_server_type = os.getenv('CONFIG_SERVER_TYPE')
-logging.info(f'The config server type : {config_server_type}')
-if config_server_type and config_server_type == 'gcs':
-  project_id = os.getenv('PROJECT_ID')
-  if project_id:
-    gcs_bucket_name = f'gcs_config_bucket_{project_id}'
-    gcs_file_name = 'config_params.json'
-    config_params_server = config_server.GcsConfigServer(
-        gcs_bucket_name, gcs_file_name
-    )
-    logging.info(
-        'The GCS bucket config server is used :'
-        f' {gcs_bucket_name}/{gcs_file_name}'
+def _GetConfigTtlSec() -> float:
+  """Returns how often, in seconds, the GCS config file is reloaded.
+
+  It is set by the env. variable 'CONFIG_TTL_SEC'.
+
+  Raises:
+      ValueError: If the env. variable is not a non-negative number.
+  """
+  config_ttl_sec_str = os.getenv('CONFIG_TTL_SEC')
+  if config_ttl_sec_str is None:
+    return config_server.DEFAULT_CONFIG_TTL_SEC
+  try:
+    config_ttl_sec = float(config_ttl_sec_str)
+  except ValueError:
+    config_ttl_sec = -1.0
+  if not config_ttl_sec >= 0:
+    raise ValueError(
+        'CONFIG_TTL_SEC must be a non-negative number of seconds:'
+        f' {config_ttl_sec_str!r}'
     )
-  else:
+  logging.info(
+      'The GCS config file is reloaded every %s seconds', config_ttl_sec
+  )
+  return config_ttl_sec
+
+
+def _CreateConfigParamsServer() -> config_server.ConfigServer:
+  """Creates the config server selected by the environment variables."""
+  config_server_type = os.getenv('CONFIG_SERVER_TYPE')
+  logging.info('The config server type : %s', config_server_type)
+  if config_server_type and config_server_type == 'gcs':
+    project_id = os.getenv('PROJECT_ID')
+    if project_id:
+      gcs_bucket_name = f'gcs_config_bucket_{project_id}'
+      gcs_file_name = 'config_params.json'
+      config_ttl_sec = _GetConfigTtlSec()
+      gcs_config_server = config_server.GcsConfigServer(
+          gcs_bucket_name, gcs_file_name, config_ttl_sec
+      )
+      logging.info(
+          'The GCS bucket config server is used : %s/%s',
+          gcs_bucket_name,
+          gcs_file_name,
+      )
+      return gcs_config_server
     logging.info(
         'The in-memory config server is used even it is configured:'
-        f' project_id={project_id}'
+        ' project_id=%s',
+        project_id,
     )
+  return config_server.InMemoryConfigServer(config_map)
+
+
+# The config server is created on the first request rather than at import
+# time, so that a GCS config server does not hold up the worker start (and the
+# Cloud Run cold start) on the storage RPCs. If it cannot be created, e.g. the
+# config file cannot be loaded, the requests are answered with a 503 so that
+# Pub/Sub redelivers their messages, and the creation is retried at most every
+# _CONFIG_SERVER_RETRY_DELAY_SEC seconds.
+_CONFIG_SERVER_RETRY_DELAY_SEC = 10.0
+_config_params_server = None
+_config_params_server_retry_at = 0.0
+_config_params_server_lock = threading.Lock()
+
+
+def _GetConfigParamsServer() -> Optional[config_server.ConfigServer]:
+  """Returns the config server, or None if it cannot be created for now."""
+  global _config_params_server, _config_params_server_retry_at
+  # Once the server is created, it is returned without taking the lock.
+  if _config_params_server is not None:
+    return _config_params_server
+  with _config_params_server_lock:
+    if (
+        _config_params_server is None
+        and time.monotonic() >= _config_params_server_retry_at
+    ):
+      try:
+        _config_params_server = _CreateConfigParamsServer()
+      except Exception:  # pylint: disable=broad-except
+        logging.error(
+            'Failed to create the config server, retrying in %s seconds',
+            _CONFIG_SERVER_RETRY_DELAY_SEC,
+            exc_info=True,
+        )
+        _config_params_server_retry_at = (
+            time.monotonic() + _CONFIG_SERVER_RETRY_DELAY_SEC
+        )
+    return _config_params_server
+
 
 gchat_handler = service_handler.GchatHandler()
 teams_handler = service_handler.MSTeamsHandler()
@@ -105,6 +174,32 @@ service_names_to_handlers = {
 
 app = Flask(__name__)
 
+# Pub/Sub push messages are at most 10MB, and alerting notifications are only
+# a few KBs, so larger request bodies are rejected without being read. The
+# Content-Length header is checked first in the handler; a chunked body has no
+# such header, so Flask also stops reading it once it exceeds the limit.
+_MAX_CONTENT_LENGTH = 1 << 20
+app.config['MAX_CONTENT_LENGTH'] = _MAX_CONTENT_LENGTH
+
+
+def _ReadRequestBody() -> bytes:
+  """Returns the request body, which is not cached on the request.
+
+  Raises:
+      werkzeug.exceptions.RequestEntityTooLarge: If the body is larger than
+      _MAX_CONTENT_LENGTH.
+  """
+  body = request.get_data(cache=False)
+  # Werkzeug stops reading a chunked body at MAX_CONTENT_LENGTH, but it only
+  # raises RequestEntityTooLarge when the stream is read past the limit.
+  if len(body) >= _MAX_CONTENT_LENGTH:
+    request.stream.read(1)
+  return body
+
+# The ids of the Pub/Sub messages being forwarded and recently delivered, keyed together with the
+# config id because the subscriptions of one topic share the message ids.
+_recent_message_ids = pubsub.RecentMessageIds(max_size=10000)
+
 
 # Note: we need to return 200 status code to ack the PubSub message, even the notification delivery
 # is failed with non-retriable errors. For retriable errors, we can return non-(100, 20x) error codes
@@ -115,44 +210,91 @@ app = Flask(__name__)
 # messsage string.
 @app.route('/<config_id>', methods=['POST'])
 def handle_pubsub_message(config_id):
+  if request.content_length and request.content_length > _MAX_CONTENT_LENGTH:
+    err_msg = 'The request body is too large: {} bytes'.format(
+        request.content_length
+    )
+    logging.error(err_msg)
+    return (f'413: {err_msg}', 200)
+  config_params_server = _GetConfigParamsServer()
+  if config_params_server is None:
+    err_msg = 'The config server is not available'
+    logging.error(err_msg)
+    return (f'503: {err_msg}', 503)
   try:
     config_param = config_params_server.GetConfig(config_id)
-  except BaseException as e:
+  except Exception as e:
     err_msg = 'Failed to get config parameters for {}: {}'.format(config_id, e)
     logging.error(err_msg)
     return (f'500: {err_msg}', 200)
-  if 'service_name' not in config_param:
+  service_name = config_param.get('service_name')
+  if service_name is None:
     err_msg = '"service_name" not found in the config parameters: {}'.format(
         config_id
     )
     logging.error(err_msg)
     return (f'500: {err_msg}', 200)
-  if config_param['service_name'] not in service_names_to_handlers:
-    err_msg = 'No handler found for the service {}'.format(
-        config_param['service_name']
-    )
+  handler = service_names_to_handlers.get(service_name)
+  if handler is None:
+    err_msg = 'No handler found for the service {}'.format(service_name)
     logging.error(err_msg)
     return (f'500: {err_msg}', 200)
 
-  handler = service_names_to_handlers[config_param['service_name']]
-
-  # Parse the Pub/Sub raw message to get the notification
-  pubsub_received_message = request.get_json()
+  # Parse the Pub/Sub raw message to get the notification. The raw body is
+  # parsed once with fast_json and is not cached on the request. A body that is
+  # not valid json yields None, which is rejected by the Pub/Sub message parser
+  # below, so the message is acked instead of being redelivered forever.
+  try:
+    pubsub_received_message = fast_json.Loads(_ReadRequestBody())
+  except exceptions.RequestEntityTooLarge:
+    err_msg = 'The request body is larger than {} bytes'.format(
+        _MAX_CONTENT_LENGTH
+    )
+    logging.error(err_msg)
+    return (f'413: {err_msg}', 200)
+  except fast_json.JSONDecodeError:
+    pubsub_received_message = None
   try:
     notification = pubsub.ExtractNotificationFromPubSubMsg(
         pubsub_received_message
     )
-    response, status_code = handler.SendNotification(config_param, notification)
-    logging.info(
-        f'Notification was sent with the status code = {status_code}:'
-        f' {response}'
-    )
-    return (f'{status_code}: {response}', 200)
+    message_id = pubsub.GetMessageId(pubsub_received_message)
+    message_key = None if message_id is None else (config_id, message_id)
+    if message_key is not None:
+      message_state = _recent_message_ids.Start(message_key)
+      if message_state == pubsub.MessageState.DELIVERED:
+        logging.info('Skipped the redelivered Pub/Sub message %s', message_id)
+        return ('200: The message was already received', 200)
+      if message_state == pubsub.MessageState.IN_FLIGHT:
+        # The first copy may still fail, so this one is not acked either.
+        logging.info('The Pub/Sub message %s is being forwarded', message_id)
+        return ('503: The message is being forwarded', 503)
+    delivered = False
+    try:
+      response, status_code = handler.SendNotification(
+          config_param, notification
+      )
+      logging.info(
+          'Notification was sent with the status code = %s: %s',
+          status_code,
+          response,
+      )
+      if status_code == 503:
+        # The service is unavailable for now, e.g. its circuit is open, so the
+        # message is not acked and Pub/Sub redelivers it later.
+        return (f'{status_code}: {response}', 503)
+      delivered = True
+      return (f'{status_code}: {response}', 200)
+    finally:
+      if message_key is not None:
+        _recent_message_ids.Finish(message_key, delivered)
   except pubsub.DataParseError as e:
-    logging.error(f'Pubsub message parse error: {e}')
+    logging.error('Pubsub message parse error: %s', e)
     return (f'400: {e}', 200)
-  except BaseException as e:
-    logging.error(f'Unexpected error when processing Pubsub message: {e}')
+  except Exception as e:
+    logging.error(
+        'Unexpected error when processing Pubsub message: %s', e, exc_info=True
+    )
     return (f'400: {e}', 200)
 
 
@@ -160,7 +302,9 @@ def main():
   PORT = int(os.getenv('PORT')) if os.getenv('PORT') else 8080
   # This is used when running locally. Gunicorn is used to run the
   # application on Cloud Run. See entrypoint in Dockerfile.
-  app.run(host='127.0.0.1', port=PORT, debug=True)
+  # The debug mode is off so that the local server runs without the reloader
+  # and the interactive debugger, the same way the app runs on Cloud Run.
+  app.run(host='127.0.0.1', port=PORT, debug=False)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,98 @@
+# Copyright 2024 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for main.py"""
+
+import base64
+import io
+import json
+import unittest
+from unittest import mock
+
+import main
+from utilities import pubsub
+
+
+def _PubsubMessageBody(message_id):
+  notification = {'incident': {'policy_name': 'test policy'}}
+  data = base64.b64encode(json.dumps(notification).encode()).decode()
+  return json.dumps({'message': {'data': data, 'messageId': message_id}})
+
+
+class HandlePubsubMessageTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self._client = main.app.test_client()
+    self._oversized_body = b'{' + b' ' * main._MAX_CONTENT_LENGTH + b'}'
+    recent_message_ids_patcher = mock.patch.object(
+        main, '_recent_message_ids', pubsub.RecentMessageIds(max_size=10)
+    )
+    recent_message_ids_patcher.start()
+    self.addCleanup(recent_message_ids_patcher.stop)
+    send_notification_patcher = mock.patch.object(
+        type(main.gchat_handler), 'SendNotification', return_value=('OK', 200)
+    )
+    self._send_notification = send_notification_patcher.start()
+    self.addCleanup(send_notification_patcher.stop)
+
+  def testOversizedBodyWithContentLengthRejected(self):
+    with mock.patch.object(main, '_GetConfigParamsServer') as get_server:
+      response = self._client.post(
+          '/tf-topic-cpu-gchat', data=self._oversized_body
+      )
+    self.assertEqual(response.status_code, 200)
+    self.assertTrue(response.get_data(as_text=True).startswith('413: '))
+    get_server.assert_not_called()
+
+  def testOversizedChunkedBodyRejected(self):
+    response = self._client.post(
+        '/tf-topic-cpu-gchat',
+        input_stream=io.BytesIO(self._oversized_body),
+        headers={'Transfer-Encoding': 'chunked'},
+        environ_overrides={'wsgi.input_terminated': True},
+    )
+    self.assertEqual(response.status_code, 200)
+    self.assertTrue(response.get_data(as_text=True).startswith('413: '))
+    self._send_notification.assert_not_called()
+
+  def testRedeliveredMessageSkipped(self):
+    body = _PubsubMessageBody('1')
+    response = self._client.post('/tf-topic-cpu-gchat', data=body)
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.get_data(as_text=True), '200: OK')
+    response = self._client.post('/tf-topic-cpu-gchat', data=body)
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(self._send_notification.call_count, 1)
+
+  def testInFlightMessageNotAcked(self):
+    main._recent_message_ids.Start(('tf-topic-cpu-gchat', '1'))
+    response = self._client.post(
+        '/tf-topic-cpu-gchat', data=_PubsubMessageBody('1')
+    )
+    self.assertEqual(response.status_code, 503)
+    self._send_notification.assert_not_called()
+
+  def testUnavailableServiceMessageResent(self):
+    self._send_notification.return_value = ('Circuit open', 503)
+    body = _PubsubMessageBody('1')
+    response = self._client.post('/tf-topic-cpu-gchat', data=body)
+    self.assertEqual(response.status_code, 503)
+    self._send_notification.return_value = ('OK', 200)
+    response = self._client.post('/tf-topic-cpu-gchat', data=body)
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(self._send_notification.call_count, 2)
+
+
+if __name__ == '__main__':
+  unittest.main()
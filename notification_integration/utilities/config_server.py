@@ -15,10 +15,19 @@
 """Configuration servers that provide 3rd-party integration parameters."""
 
 import abc
-import json
+import functools
 import logging
-from typing import Any, Dict
+import sys
+import threading
+import time
+import types
+from typing import Any, Dict, Mapping, Optional
 from google.cloud import storage
+from utilities import fast_json
+
+# How long, in seconds, the GCS config server uses the loaded config before
+# reloading it from GCS.
+DEFAULT_CONFIG_TTL_SEC = 300
 
 
 class Error(Exception):
@@ -52,30 +61,44 @@ class ParamNotFoundError(Error):
 
 
 # Private helper functions.
+@functools.lru_cache(maxsize=1)
+def _GetStorageClient() -> storage.Client:
+  """Returns the GCS client shared by all the GCS config servers.
+
+  The client is created on the first call, since creating it looks up the
+  credentials and the project of the environment.
+  """
+  return storage.Client()
+
+
+# The default value of the config lookups, to tell a missing key from a key set
+# to None without raising and catching a KeyError.
+_MISSING = object()
+
+
 def _GetConfigFromConfigMap(
-    config_id: str, config_map: Dict[str, Dict[str, Any]]
-) -> Dict[str, Any]:
+    config_id: str, config_map: Mapping[str, Mapping[str, Any]]
+) -> Mapping[str, Any]:
   """Retrieves the configuration based on the config ID."""
-  try:
-    return config_map[config_id]
-  except BaseException as e:
-    err_msg = f'Failed to get the configuration parameter {config_id}: {e}'
-    raise ConfigNotFoundError(err_msg) from e
+  config = config_map.get(config_id, _MISSING)
+  if config is _MISSING:
+    raise ConfigNotFoundError(f'Config {config_id!r} not found')
+  return config
 
 
 def _GetConfigParamFromConfigMap(
-    config_id: str, param_name: str, config_map: Dict[str, Dict[str, Any]]
+    config_id: str,
+    param_name: str,
+    config_map: Mapping[str, Mapping[str, Any]],
 ) -> Any:
   """Retrieves the configuration parameter based on the config ID and parameter name."""
   config = _GetConfigFromConfigMap(config_id, config_map)
-  try:
-    return config[param_name]
-  except BaseException as e:
-    err_msg = (
-        'Failed to get the configuration parameter'
-        f' {config_id}/{param_name}: {e}'
+  param = config.get(param_name, _MISSING)
+  if param is _MISSING:
+    raise ParamNotFoundError(
+        f'Parameter {param_name!r} not found in config {config_id!r}'
     )
-    raise ParamNotFoundError(err_msg) from e
+  return param
 
 
 def _ValidateConfigMap(config_map: Any):
@@ -83,23 +106,23 @@ def _ValidateConfigMap(config_map: Any):
   if not isinstance(config_map, dict):
     raise InvalidConfigDataError('The configuration is not a dict json object')
 
-  for k, v in config_map.items():
-    if not (isinstance(k, str) and isinstance(v, dict)):
-      raise InvalidConfigDataError(
-          'The configuration map must be a Dict[str, Dict[str, Any]] object.'
-      )
-    for config_k, _ in v.items():
-      if not isinstance(config_k, str):
-        raise InvalidConfigDataError(
-            'The configuration map must be a  Dict[str, Dict[str, Any]] object.'
-        )
+  # all() stops at the first invalid key or value.
+  if not all(
+      isinstance(k, str)
+      and isinstance(v, dict)
+      and all(isinstance(config_k, str) for config_k in v)
+      for k, v in config_map.items()
+  ):
+    raise InvalidConfigDataError(
+        'The configuration map must be a Dict[str, Dict[str, Any]] object.'
+    )
 
 
 class ConfigServer(abc.ABC):
   """Abstract base class that represents a configuration server."""
 
   @abc.abstractmethod
-  def GetConfig(self, config_id: str) -> Dict[str, Any]:
+  def GetConfig(self, config_id: str) -> Mapping[str, Any]:
     """Retrieves the config parameters from a given configuration.
 
     Args:
@@ -141,9 +164,20 @@ class InMemoryConfigServer(ConfigServer):
 
   def __init__(self, config_map: Dict[str, Dict[str, Any]]):
     _ValidateConfigMap(config_map)
-    self._config_map = config_map
-
-  def GetConfig(self, config_id: str) -> Dict[str, Any]:
+    # The configurations are handed out as read-only views, so the callers
+    # share them without being able to modify the loaded config. The keys are
+    # interned, so that the lookups with the same literal strings in the code
+    # match by identity and a config reloaded from json does not keep its own
+    # copies of the key strings.
+    self._config_map = {
+        sys.intern(config_id): types.MappingProxyType({
+            sys.intern(param_name): param
+            for param_name, param in config.items()
+        })
+        for config_id, config in config_map.items()
+    }
+
+  def GetConfig(self, config_id: str) -> Mapping[str, Any]:
     """Retrieves the configuration."""
     return _GetConfigFromConfigMap(config_id, self._config_map)
 
@@ -166,19 +200,31 @@ class GcsConfigServer(ConfigServer):
   the GCS object.
   """
 
-  def __init__(self, bucket_name: str, file_name: str):
-    try:
-      storage_client = storage.Client()
-      bucket = storage_client.get_bucket(bucket_name)
-    except BaseException as e:
-      err_msg = 'Failed to get the GCS bucket {bucket_name}: {e}'.format(
-          bucket_name=bucket_name, e=e
-      )
-      raise ConfigServerInitError(err_msg) from e
+  def __init__(
+      self,
+      bucket_name: str,
+      file_name: str,
+      ttl_sec: float = DEFAULT_CONFIG_TTL_SEC,
+  ):
+    """Loads the configuration from GCS.
 
+    Args:
+       bucket_name: The name of the GCS bucket that has the config file.
+       file_name: The name of the config file in the bucket.
+       ttl_sec: How long to use the loaded config before reloading it. Once it
+         expires, the config is reloaded in a background thread and the
+         expired config keeps being served until the reload succeeds.
+    """
+    self._bucket_name = bucket_name
+    self._file_name = file_name
+    self._ttl_sec = ttl_sec
     try:
-      blob = bucket.get_blob(file_name)
-    except BaseException as e:
+      storage_client = _GetStorageClient()
+      # bucket() and blob() only create local handles without sending any
+      # request, so the config object is fetched with a single download
+      # instead of two extra metadata round-trips before it.
+      self._blob = storage_client.bucket(bucket_name).blob(file_name)
+    except Exception as e:
       err_msg = (
           'Failed to get the GCS object {bucket_name}/{file_name} {e}'.format(
               bucket_name=bucket_name, file_name=file_name, e=e
@@ -186,29 +232,93 @@ class GcsConfigServer(ConfigServer):
       )
       raise ConfigServerInitError(err_msg) from e
 
+    self._in_memory_server = self._LoadInMemoryServer()
+    # The generation of the loaded config file, if the download reported it.
+    self._generation = self._blob.generation
+    self._loaded_at = time.monotonic()
+    self._reload_lock = threading.Lock()
+    self._reloading = False
+
+  def _LoadInMemoryServer(
+      self, generation: Optional[int] = None
+  ) -> InMemoryConfigServer:
+    """Downloads the config file and creates an in-memory server from it.
+
+    Args:
+       generation: If set, the download fails unless the config file still has
+         this generation, so the loaded config always matches it.
+    """
     try:
-      raw_content = blob.download_as_string()
-      config_map = json.loads(raw_content)
-    except BaseException as e:
+      if generation is None:
+        raw_content = self._blob.download_as_bytes()
+      else:
+        raw_content = self._blob.download_as_bytes(
+            if_generation_match=generation
+        )
+      # The downloaded bytes are parsed without decoding them into a str.
+      config_map = fast_json.Loads(raw_content)
+    except Exception as e:
       err_msg = (
           'Failed to load the configuration map from the GCS '
           'object {bucket_name}/{file_name} {e}'
-      ).format(bucket_name=bucket_name, file_name=file_name, e=e)
+      ).format(bucket_name=self._bucket_name, file_name=self._file_name, e=e)
       raise ConfigServerInitError(err_msg) from e
 
-    _ValidateConfigMap(config_map)
-    self._in_memory_server = InMemoryConfigServer(config_map)
+    # The config map is validated by the in-memory server.
+    in_memory_server = InMemoryConfigServer(config_map)
 
     logging.info(
         'Successfully loaded the config data from %s/%s',
-        bucket_name,
-        file_name,
+        self._bucket_name,
+        self._file_name,
     )
+    return in_memory_server
 
-  def GetConfig(self, config_id: str) -> Dict[str, Any]:
+  def _Reload(self):
+    """Reloads the config, keeping the current one if the reload fails."""
+    try:
+      # Only the object metadata is fetched first, so an unchanged config file
+      # is neither downloaded nor parsed again.
+      self._blob.reload()
+      generation = self._blob.generation
+      if generation is not None and generation == self._generation:
+        logging.info(
+            'The config data in %s/%s is unchanged',
+            self._bucket_name,
+            self._file_name,
+        )
+      else:
+        self._in_memory_server = self._LoadInMemoryServer(generation)
+        self._generation = generation
+    except Exception as e:
+      logging.error(
+          'Failed to reload the config data from %s/%s, keep using the'
+          ' loaded one: %s',
+          self._bucket_name,
+          self._file_name,
+          e,
+          exc_info=True,
+      )
+    finally:
+      # A failed reload is also retried only after another TTL, so that GCS
+      # is not hit by every request while it is unavailable.
+      self._loaded_at = time.monotonic()
+      self._reloading = False
+
+  def _GetInMemoryServer(self) -> InMemoryConfigServer:
+    """Returns the loaded config, starting a reload if it has expired."""
+    if time.monotonic() - self._loaded_at >= self._ttl_sec:
+      with self._reload_lock:
+        start_reload = not self._reloading
+        self._reloading = True
+      if start_reload:
+        threading.Thread(target=self._Reload, daemon=True).start()
+    return self._in_memory_server
+
+  def GetConfig(self, config_id: str) -> Mapping[str, Any]:
     """Retrieves the configuration."""
-    return self._in_memory_server.GetConfig(config_id)
+    return self._GetInMemoryServer().GetConfig(config_id)
 
   def GetConfigParam(self, config_id: str, param_name: str) -> Any:
     """Retrieves the configuration parameter."""
-    return self._in_memory_server.GetConfigParam(config_id, param_name)
+    return self._GetInMemoryServer().GetConfigParam(config_id, param_name)
@@ -13,6 +13,8 @@
 # limitations under the License.
 """Unit tests for config_server.py."""
 import json
+import unittest
+from unittest import mock
 from unittest.mock import Mock
 from google.cloud import storage
 from utilities import config_server
@@ -58,12 +60,16 @@ class InMemoryConfigServerTest(unittest.TestCase):
         'service_name': 'chat',
         'webhook_url': 'https://chat.123.com',
     }
-    self.assertDictEqual(returned_val, expected_val)
+    self.assertDictEqual(dict(returned_val), expected_val)
 
   def testGetConfigParamInvaidParamName(self):
     with self.assertRaises(config_server.ParamNotFoundError):
       self._test_server.GetConfigParam('channel-1', 'type')
 
+  def testGetConfigReadOnly(self):
+    with self.assertRaises(TypeError):
+      self._test_server.GetConfig('channel-1')['webhook_url'] = 'https://123'
+
   def testGetConfigParamSucceed(self):
     returned_val = self._test_server.GetConfigParam('channel-1', 'webhook_url')
     expected_val = 'https://chat.123.com'
@@ -75,25 +81,27 @@ class GcsConfigServerTest(unittest.TestCase):
   def setUp(self):
     # Call to the parent class's setUp method
     super().setUp()
-    # To mock the GCS blob returned by bucket.get_blob.
+    # To mock the GCS blob returned by bucket.blob.
     self._blob_mock = Mock()
 
-    # To mock the GCS bucket returned by storage_client.get_bucket.
+    # To mock the GCS bucket returned by storage_client.bucket.
     self._bucket_mock = Mock()
-    self._bucket_mock.get_blob = Mock(return_value=self._blob_mock)
+    self._bucket_mock.blob = Mock(return_value=self._blob_mock)
 
     # To mock storage_client.
     self._storage_client_mock = Mock()
-    self._storage_client_mock.get_bucket = Mock(return_value=self._bucket_mock)
+    self._storage_client_mock.bucket = Mock(return_value=self._bucket_mock)
 
     storage.Client = Mock(return_value=self._storage_client_mock)
+    # The GCS client is cached by the module, drop the one of the last test.
+    config_server._GetStorageClient.cache_clear()
 
     # Dummy GCS bucket name and GCS object name used in the tests.
     self._test_bucket = 'test_bucket'
     self._test_filename = 'test_file'
 
     # Create a test server and reset all the call attributes on the mock objects.
-    self._blob_mock.download_as_string.return_value = _VALID_CONFIG_MAP_JSON_STR
+    self._blob_mock.download_as_bytes.return_value = _VALID_CONFIG_MAP_JSON_STR
     self._test_server = config_server.GcsConfigServer(
         self._test_bucket, self._test_filename
     )
@@ -103,43 +111,54 @@ class GcsConfigServerTest(unittest.TestCase):
     storage.Client.reset_mock()
 
   def testInitFailedDueToGetBucketException(self):
-    error_msg = 'Bucket not found'
-    self._storage_client_mock.get_bucket.side_effect = ValueError(error_msg)
+    error_msg = 'Invalid bucket name'
+    self._storage_client_mock.bucket.side_effect = ValueError(error_msg)
     with self.assertRaisesRegex(
         config_server.ConfigServerInitError, f'{error_msg}'
     ):
       config_server.GcsConfigServer(self._test_bucket, self._test_filename)
-    storage.Client.assert_called_once()
-    self._storage_client_mock.get_bucket.assert_called_once_with(
-        self._test_bucket
-    )
+    # The GCS client created for the server in setUp is reused.
+    storage.Client.assert_not_called()
+    self._storage_client_mock.bucket.assert_called_once_with(self._test_bucket)
 
   def testInitFailedDueToGetBlobException(self):
-    error_msg = 'Object not found'
-    self._bucket_mock.get_blob.side_effect = ValueError(error_msg)
+    error_msg = 'Invalid object name'
+    self._bucket_mock.blob.side_effect = ValueError(error_msg)
 
     with self.assertRaisesRegex(
         config_server.ConfigServerInitError, f'{error_msg}'
     ):
       config_server.GcsConfigServer(self._test_bucket, self._test_filename)
-    self._bucket_mock.get_blob.assert_called_once_with(self._test_filename)
+    self._bucket_mock.blob.assert_called_once_with(self._test_filename)
+
+  def testInitReusesStorageClient(self):
+    config_server.GcsConfigServer(self._test_bucket, self._test_filename)
+    config_server.GcsConfigServer(self._test_bucket, self._test_filename)
+    storage.Client.assert_not_called()
+    self.assertEqual(self._storage_client_mock.bucket.call_count, 2)
+
+  def testInitDownloadsBlobWithoutMetadataRequests(self):
+    config_server.GcsConfigServer(self._test_bucket, self._test_filename)
+    self._storage_client_mock.get_bucket.assert_not_called()
+    self._bucket_mock.get_blob.assert_not_called()
+    self._blob_mock.download_as_bytes.assert_called_once_with()
 
   def testInitFailedDueToBlobDownlaodException(self):
     error_msg = 'Blob download failed'
-    self._blob_mock.download_as_string.side_effect = ValueError(error_msg)
+    self._blob_mock.download_as_bytes.side_effect = ValueError(error_msg)
 
     with self.assertRaisesRegex(
         config_server.ConfigServerInitError, f'{error_msg}'
     ):
       config_server.GcsConfigServer(self._test_bucket, self._test_filename)
-    self._blob_mock.download_as_string.assert_called_once_with()
+    self._blob_mock.download_as_bytes.assert_called_once_with()
 
   def testInitFailedDueToBlobJsonLoadsFailed(self):
-    self._blob_mock.download_as_string.return_value = '{:::}'
+    self._blob_mock.download_as_bytes.return_value = '{:::}'
 
     with self.assertRaises(config_server.ConfigServerInitError):
       config_server.GcsConfigServer(self._test_bucket, self._test_filename)
-    self._blob_mock.download_as_string.assert_called_once_with()
+    self._blob_mock.download_as_bytes.assert_called_once_with()
 
   def testInitFailedDueToBlobInvaidContent(self):
     invalid_blob_json_strs = [
@@ -148,7 +167,7 @@ class GcsConfigServerTest(unittest.TestCase):
         '{"1": "2"}',  # Not a dict value.
     ]
     for json_str in invalid_blob_json_strs:
-      self._blob_mock.download_as_string.return_value = json_str
+      self._blob_mock.download_as_bytes.return_value = json_str
       with self.assertRaises(config_server.InvalidConfigDataError):
         config_server.GcsConfigServer(self._test_bucket, self._test_filename)
 
@@ -162,7 +181,7 @@ class GcsConfigServerTest(unittest.TestCase):
         'service_name': 'chat',
         'webhook_url': 'https://chat.123.com',
     }
-    self.assertDictEqual(returned_val, expected_val)
+    self.assertDictEqual(dict(returned_val), expected_val)
 
   def testGetConfigParamInvaidParamName(self):
     with self.assertRaises(config_server.ParamNotFoundError):
@@ -174,5 +193,76 @@ class GcsConfigServerTest(unittest.TestCase):
     self.assertEqual(returned_val, expected_val)
 
 
+class GcsConfigServerReloadTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self._blob_mock = Mock()
+    self._blob_mock.download_as_bytes.return_value = _VALID_CONFIG_MAP_JSON_STR
+    self._blob_mock.generation = 1
+    storage_client_mock = Mock()
+    storage_client_mock.bucket.return_value.blob.return_value = self._blob_mock
+    storage.Client = Mock(return_value=storage_client_mock)
+    config_server._GetStorageClient.cache_clear()
+
+    # Run the reload threads synchronously.
+    def _StartThread(target, daemon):
+      del daemon  # Unused.
+      return Mock(start=target)
+
+    patcher = mock.patch.object(
+        config_server.threading, 'Thread', side_effect=_StartThread
+    )
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def testGetConfigNotReloadedBeforeTtl(self):
+    test_server = config_server.GcsConfigServer('test_bucket', 'test_file')
+    self._blob_mock.reset_mock()
+    test_server.GetConfig('channel-1')
+    self._blob_mock.download_as_bytes.assert_not_called()
+
+  def testGetConfigReloadedAfterTtl(self):
+    test_server = config_server.GcsConfigServer(
+        'test_bucket', 'test_file', ttl_sec=0
+    )
+    self._blob_mock.generation = 2
+    self._blob_mock.download_as_bytes.return_value = json.dumps(
+        {'channel-2': {'service_name': 'chat'}}
+    )
+    # The reload thread is run synchronously in the tests.
+    self.assertDictEqual(
+        dict(test_server.GetConfig('channel-2')), {'service_name': 'chat'}
+    )
+    # The reloaded config is the one of the generation just looked up.
+    self._blob_mock.download_as_bytes.assert_called_with(
+        if_generation_match=2
+    )
+
+  def testGetConfigKeepsLoadedConfigWhenReloadFailed(self):
+    test_server = config_server.GcsConfigServer(
+        'test_bucket', 'test_file', ttl_sec=0
+    )
+    self._blob_mock.generation = 2
+    self._blob_mock.download_as_bytes.side_effect = ValueError('GCS is down')
+    for _ in range(2):
+      self.assertDictEqual(
+          dict(test_server.GetConfig('channel-1')),
+          _VALID_CONFIG_MAP['channel-1'],
+      )
+
+  def testGetConfigNotDownloadedWhenUnchanged(self):
+    test_server = config_server.GcsConfigServer(
+        'test_bucket', 'test_file', ttl_sec=0
+    )
+    self._blob_mock.reset_mock()
+    self.assertDictEqual(
+        dict(test_server.GetConfig('channel-1')),
+        _VALID_CONFIG_MAP['channel-1'],
+    )
+    self._blob_mock.reload.assert_called_once_with()
+    self._blob_mock.download_as_bytes.assert_not_called()
+
+
 if __name__ == '__main__':
   unittest.main()
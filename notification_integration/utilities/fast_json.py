@@ -0,0 +1,70 @@
+# Copyright 2024 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Json helpers that use orjson when it is installed and json otherwise."""
+
+import json
+from typing import Any, Union
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+# orjson.JSONDecodeError is a subclass of json.JSONDecodeError, so callers can
+# catch this error no matter which library decodes the data.
+JSONDecodeError = json.JSONDecodeError
+
+
+def Loads(data: Union[bytes, str]) -> Any:
+  """Deserializes a json document.
+
+  Args:
+      data: The json document. It is parsed directly when given as UTF-8 bytes,
+        without decoding it into a str first.
+
+  Returns:
+      The deserialized python object.
+
+  Raises:
+      JSONDecodeError: If data is not a valid json document, including bytes
+        that are not valid UTF-8.
+  """
+  if orjson is not None:
+    return orjson.loads(data)
+  try:
+    return json.loads(data)
+  except UnicodeDecodeError as e:
+    # orjson reports invalid UTF-8 as a decode error, and so does the fallback.
+    raise JSONDecodeError(f'Invalid UTF-8 data: {e}', '', 0) from e
+
+
+def Dumps(obj: Any) -> bytes:
+  """Serializes a python object into a compact json document.
+
+  Args:
+      obj: The python object to serialize.
+
+  Returns:
+      The UTF-8 encoded json document. Both libraries produce the same output:
+      no whitespace between the tokens and non-ASCII characters left unescaped.
+
+  Raises:
+      TypeError: If obj contains a value that is not json serializable.
+  """
+  if orjson is not None:
+    return orjson.dumps(obj)
+  return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode(
+      'utf-8'
+  )
@@ -0,0 +1,48 @@
+# Copyright 2024 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for fast_json.py."""
+
+import unittest
+from utilities import fast_json
+
+
+class FastJsonTest(unittest.TestCase):
+
+  def testLoadsSucceed(self):
+    expected_result = {'incident': {'state': 'open', 'started_at': 1620754533}}
+    for data in [
+        '{"incident": {"state": "open", "started_at": 1620754533}}',
+        b'{"incident": {"state": "open", "started_at": 1620754533}}',
+        b' \n{"incident": {"state": "open", "started_at": 1620754533}}\n ',
+    ]:
+      self.assertDictEqual(fast_json.Loads(data), expected_result)
+
+  def testLoadsInvalidData(self):
+    for data in ['{123:}', b'{"state": "open"', b'', b'{"state": "\xff"}']:
+      with self.assertRaises(fast_json.JSONDecodeError):
+        fast_json.Loads(data)
+
+  def testDumpsSucceed(self):
+    self.assertEqual(
+        fast_json.Dumps({'text': 'caf\u00e9 "open"', 'count': [1, None]}),
+        '{"text":"caf\u00e9 \\"open\\"","count":[1,null]}'.encode('utf-8'),
+    )
+
+  def testDumpsNotSerializable(self):
+    with self.assertRaises(TypeError):
+      fast_json.Dumps({'data': object()})
+
+
+if __name__ == '__main__':
+  unittest.main()
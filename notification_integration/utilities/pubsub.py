@@ -16,8 +16,11 @@
 
 import base64
 import binascii
-import json
-from typing import Any, Dict, Text
+import collections
+import enum
+import threading
+from typing import Any, Dict, Hashable, Optional, Text
+from utilities import fast_json
 
 
 class Error(Exception):
@@ -56,14 +59,71 @@ def ExtractNotificationFromPubSubMsg(
   except TypeError as e:
     raise DataParseError('data should be in a string format') from e
 
-  data_string = data_bytes.decode('utf-8')
-  data_string = data_string.strip()
-
+  # The decoded bytes are parsed directly; json ignores the surrounding
+  # whitespace, so there is no need to decode and strip them into a str first.
   try:
-    data_json = json.loads(data_string)
-  except json.JSONDecodeError as e:
+    data_json = fast_json.Loads(data_bytes)
+  except fast_json.JSONDecodeError as e:
     raise DataParseError(
         'data can not be loaded as a json object: {}'.format(e), 400
     )
 
   return data_json
+
+
+def GetMessageId(pubsub_msg: Dict[Text, Any]) -> Optional[Text]:
+  """Returns the id of a Pub/Sub push message, or None if it has none."""
+  message = pubsub_msg.get('message')
+  if not isinstance(message, dict):
+    return None
+  # Push requests carry the id under both names.
+  return message.get('messageId') or message.get('message_id')
+
+
+class MessageState(enum.Enum):
+  """The state of a message id in RecentMessageIds."""
+
+  NEW = 'new'
+  IN_FLIGHT = 'in_flight'
+  DELIVERED = 'delivered'
+
+
+class RecentMessageIds:
+  """Thread-safe record of the message ids being and recently forwarded.
+
+  Pub/Sub delivers a message at least once, so a message can be pushed again,
+  e.g. when its ack deadline expires while it is being forwarded. The ids of the
+  messages being forwarded are kept until they are finished, so that a copy
+  pushed meanwhile is neither forwarded nor acked. The ids of the delivered
+  messages are remembered, oldest forgotten first, so that their copies are
+  dropped instead of being sent to the 3rd-party service again.
+  """
+
+  def __init__(self, max_size: int):
+    self._max_size = max_size
+    self._lock = threading.Lock()
+    self._in_flight_ids = set()
+    # Only the keys are used; they are kept in the order they were delivered.
+    self._delivered_ids = collections.OrderedDict()
+
+  def Start(self, message_id: Hashable) -> MessageState:
+    """Returns the state of the id, which is marked in flight if it is new."""
+    with self._lock:
+      if message_id in self._delivered_ids:
+        return MessageState.DELIVERED
+      if message_id in self._in_flight_ids:
+        return MessageState.IN_FLIGHT
+      self._in_flight_ids.add(message_id)
+      return MessageState.NEW
+
+  def Finish(self, message_id: Hashable, delivered: bool):
+    """Ends the in-flight id, which is remembered if it was delivered.
+
+    An id that was not delivered can be started again.
+    """
+    with self._lock:
+      self._in_flight_ids.discard(message_id)
+      if delivered:
+        self._delivered_ids[message_id] = None
+        if len(self._delivered_ids) > self._max_size:
+          self._delivered_ids.popitem(last=False)
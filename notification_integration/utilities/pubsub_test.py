@@ -71,9 +71,61 @@ class PubSubTest(unittest.TestCase):
     }
     self.assertDictEqual(result, expected_result)
 
+  def testExtractNotificationFromPubSubMsgSurroundingWhitespace(self):
+    data_str = base64.b64encode(b' \n{"version": "1.2"}\n ').decode('utf-8')
+    pubsub_msg = {'message': {'data': data_str}}
+    result = pubsub.ExtractNotificationFromPubSubMsg(pubsub_msg)
+    self.assertDictEqual(result, {'version': '1.2'})
+
+  def testExtractNotificationFromPubSubMsgNotJson(self):
+    data_str = base64.b64encode(b'{"version": ').decode('utf-8')
+    pubsub_msg = {'message': {'data': data_str}}
+    with self.assertRaises(pubsub.DataParseError):
+      pubsub.ExtractNotificationFromPubSubMsg(pubsub_msg)
+
   def testExtractNotificationFromPubSubMsgJsonDumpsFailed(self):
     pubsub_msg = {
         'message': {'data': 'InsxMjM6fSI='}
     }  # data corresponds to '{123:}'
     # with self.assertRaises(pubsub.DataParseError):
     pubsub.ExtractNotificationFromPubSubMsg(pubsub_msg)
+
+  def testGetMessageIdSucceed(self):
+    for pubsub_msg in [
+        {'message': {'data': '', 'messageId': '123', 'message_id': '123'}},
+        {'message': {'data': '', 'message_id': '123'}},
+    ]:
+      self.assertEqual(pubsub.GetMessageId(pubsub_msg), '123')
+
+  def testGetMessageIdNotSet(self):
+    for pubsub_msg in [{'message': {'data': ''}}, {'message': 'fake message'}]:
+      self.assertIsNone(pubsub.GetMessageId(pubsub_msg))
+
+
+class RecentMessageIdsTest(unittest.TestCase):
+
+  def testStartNewAndInFlight(self):
+    recent_ids = pubsub.RecentMessageIds(max_size=2)
+    self.assertEqual(recent_ids.Start('1'), pubsub.MessageState.NEW)
+    self.assertEqual(recent_ids.Start('1'), pubsub.MessageState.IN_FLIGHT)
+    self.assertEqual(recent_ids.Start('2'), pubsub.MessageState.NEW)
+
+  def testFinishDelivered(self):
+    recent_ids = pubsub.RecentMessageIds(max_size=2)
+    recent_ids.Start('1')
+    recent_ids.Finish('1', delivered=True)
+    self.assertEqual(recent_ids.Start('1'), pubsub.MessageState.DELIVERED)
+
+  def testFinishNotDelivered(self):
+    recent_ids = pubsub.RecentMessageIds(max_size=2)
+    recent_ids.Start('1')
+    recent_ids.Finish('1', delivered=False)
+    self.assertEqual(recent_ids.Start('1'), pubsub.MessageState.NEW)
+
+  def testFinishForgetsOldestDeliveredIds(self):
+    recent_ids = pubsub.RecentMessageIds(max_size=2)
+    for message_id in ['1', '2', '3']:
+      self.assertEqual(recent_ids.Start(message_id), pubsub.MessageState.NEW)
+      recent_ids.Finish(message_id, delivered=True)
+    self.assertEqual(recent_ids.Start('1'), pubsub.MessageState.NEW)
+    self.assertEqual(recent_ids.Start('3'), pubsub.MessageState.DELIVERED)
@@ -14,11 +14,62 @@
 
 """Module that provides handlers to integrate with 3rd-party services."""
 import abc
-import datetime
-import json
 import logging
+import re
+import threading
+import time
 from typing import Any, Dict, Text, Tuple
-import httplib2
+import requests
+from requests import adapters
+from urllib3 import util as urllib3_util
+from utilities import fast_json
+
+# The connect and read timeouts, in seconds, of a http request sent to a
+# 3rd-party service. Without them a hung service would hold the request thread
+# forever.
+# With the retries below, a notification takes at most 3 attempts of 3 seconds
+# plus 0.4 seconds of backoff, which stays under the 10 seconds Pub/Sub push
+# ack deadline, so a slow service does not make Pub/Sub redeliver the message
+# while it is still being sent.
+_HTTP_TIMEOUT_SEC = (1.0, 2.0)
+
+# Transient failures of a 3rd-party service are retried with an exponential
+# backoff before the notification is given up. Read timeouts are not retried,
+# since the service may have posted the message already, and the Retry-After
+# header is ignored so that a retry never blocks the thread for longer than
+# the backoff.
+_HTTP_RETRY = urllib3_util.Retry(
+    total=2,
+    read=0,
+    backoff_factor=0.2,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=("POST",),
+    respect_retry_after_header=False,
+    # Return the last response instead of raising when all the retries fail,
+    # so its status code is still reported to the caller.
+    raise_on_status=False,
+)
+
+# The HTTP session shared by all the handlers. It keeps the connections to the
+# 3rd-party services alive and reuses them across notifications, so only the
+# first notification sent to a host pays for the TCP and TLS handshakes.
+# Each host keeps up to _HTTP_POOL_MAXSIZE idle connections, one per gunicorn
+# thread (see Dockerfile), so a burst of notifications to the same webhook
+# host does not close and re-open the connections beyond the urllib3 default
+# of 10. Connection pools are kept for up to _HTTP_POOL_CONNECTIONS hosts.
+_HTTP_POOL_CONNECTIONS = 16
+_HTTP_POOL_MAXSIZE = 80
+_HTTP_ADAPTER = adapters.HTTPAdapter(
+    pool_connections=_HTTP_POOL_CONNECTIONS,
+    pool_maxsize=_HTTP_POOL_MAXSIZE,
+    max_retries=_HTTP_RETRY,
+)
+_HTTP_SESSION = requests.Session()
+_HTTP_SESSION.mount("https://", _HTTP_ADAPTER)
+_HTTP_SESSION.mount("http://", _HTTP_ADAPTER)
+
+# The headers of the json http requests sent to the 3rd-party services.
+_JSON_HTTP_HEADERS = {"Content-Type": "application/json; charset=UTF-8"}
 
 
 class Error(Exception):
@@ -32,19 +83,116 @@ class ConfigParamsError(Error):
   pass
 
 
+class CircuitOpenError(Error):
+  """Requests to a http URL are rejected because it keeps failing."""
+
+  pass
+
+
+class _CircuitBreaker:
+  """Rejects the requests to the http URLs that keep failing.
+
+  After fail_max consecutive failed requests to a URL, the circuit of the URL
+  opens and its requests are rejected for reset_timeout_sec seconds, so a
+  failing 3rd-party service does not hold the request threads on timeouts and
+  retries. After that, one trial request is let through: the circuit closes
+  if it succeeds and opens again otherwise. It is thread-safe.
+  """
+
+  def __init__(self, fail_max: int, reset_timeout_sec: float):
+    self._fail_max = fail_max
+    self._reset_timeout_sec = reset_timeout_sec
+    self._lock = threading.Lock()
+    # The number of consecutive failures of each URL.
+    self._failure_counts = {}
+    # The time.monotonic() time until which each open circuit rejects requests.
+    self._open_until = {}
+
+  def BeforeRequest(self, url: Text):
+    """Raises CircuitOpenError if the requests to the url are rejected."""
+    with self._lock:
+      open_until = self._open_until.get(url)
+      if open_until is None:
+        return
+      now = time.monotonic()
+      if now < open_until:
+        raise CircuitOpenError(
+            f"Requests are rejected after {self._fail_max} consecutive"
+            f" failures, retry in {open_until - now:.0f} seconds: {url}"
+        )
+      # Let this request through as the trial, and reject the others until
+      # its result is recorded.
+      self._open_until[url] = now + self._reset_timeout_sec
+
+  def RecordSuccess(self, url: Text):
+    with self._lock:
+      self._failure_counts.pop(url, None)
+      self._open_until.pop(url, None)
+
+  def RecordFailure(self, url: Text):
+    with self._lock:
+      failure_count = self._failure_counts.get(url, 0) + 1
+      self._failure_counts[url] = failure_count
+      if failure_count >= self._fail_max:
+        self._open_until[url] = time.monotonic() + self._reset_timeout_sec
+
+
+# The circuit breaker shared by all the handlers.
+_CIRCUIT_BREAKER = _CircuitBreaker(fail_max=10, reset_timeout_sec=30)
+
+
+def _FormatUtcTimestamp(timestamp: int) -> Text:
+  """Formats a unix timestamp as "YYYY-mm-dd HH:MM:SS (UTC)"."""
+  # time.gmtime() and a f-string are cheaper than building a datetime object
+  # and running the locale-aware strftime().
+  t = time.gmtime(timestamp)
+  return (
+      f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d}"
+      f" {t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d} (UTC)"
+  )
+
+
+class _JsonTemplate:
+  """A json document that is serialized once and filled in per notification.
+
+  The fields of the document are the "@@field_name@@" strings in the template
+  object. Render() replaces each of them with the json dump of its value, so
+  only the values are serialized per notification, and they are escaped
+  properly whatever characters they contain.
+  """
+
+  _FIELD_PATTERN = re.compile(rb'"@@(\w+)@@"')
+
+  def __init__(self, template: Any):
+    # The split alternates the literal chunks and the field names, starting
+    # and ending with a (possibly empty) literal chunk.
+    parts = self._FIELD_PATTERN.split(fast_json.Dumps(template))
+    self._literals = parts[0::2]
+    self._field_names = [name.decode("utf-8") for name in parts[1::2]]
+
+  def Render(self, values: Dict[Text, Any]) -> bytes:
+    """Returns the json document with the fields set to the given values."""
+    chunks = [self._literals[0]]
+    for field_name, literal in zip(self._field_names, self._literals[1:]):
+      chunks.append(fast_json.Dumps(values[field_name]))
+      chunks.append(literal)
+    return b"".join(chunks)
+
+
 class ServiceHandler(abc.ABC):
   """Abstract base class that represents a 3rd-party service handler."""
 
+  # The handlers keep their constants at the class level and only a few
+  # attributes per instance, so instances need no __dict__.
+  __slots__ = ("_service_name",)
+
   def __init__(self, service_name: Text):
     # service_name is the name of the service this handler is to integrate with.
     self._service_name = service_name
 
   def CheckServiceNameInConfigParams(self, config_params: Dict[str, Any]):
     """Ensures 'service_name' is in the config_params and set correctly."""
-    if not (
-        "service_name" in config_params
-        and config_params["service_name"] == self._service_name
-    ):
+    if config_params.get("service_name") != self._service_name:
       raise ConfigParamsError(
           f"service_name is not set or different from {self._service_name}:"
           f" {config_params}"
@@ -93,7 +241,9 @@ class ServiceHandler(abc.ABC):
 
 
 class HttpRequestBasedHandler(ServiceHandler, abc.ABC):
-  """Abstract base class for handlers that use httplib2.Http to send requests."""
+  """Abstract base class for handlers that send notifications via http requests."""
+
+  __slots__ = ("_http_method",)
 
   def __init__(self, service_name: Text, http_method: Text):
     super(HttpRequestBasedHandler, self).__init__(service_name)
@@ -102,7 +252,7 @@ class HttpRequestBasedHandler(ServiceHandler, abc.ABC):
   @abc.abstractmethod
   def _BuildHttpRequestBody(
       self, config_params: Dict[Text, Any], notification: Dict[Any, Any]
-  ) -> Text:
+  ) -> bytes:
     """Converts the notification into a http request body.
 
     Args:
@@ -111,7 +261,7 @@ class HttpRequestBasedHandler(ServiceHandler, abc.ABC):
         notification: An incoming alerting message to forward.
 
     Returns:
-        A json dump (str) of the created message json object.
+        A UTF-8 encoded json dump of the created message json object.
 
     Raises:
         Any exception raised during the process.
@@ -158,7 +308,7 @@ class HttpRequestBasedHandler(ServiceHandler, abc.ABC):
 
   def _SendHttpRequest(
       self, config_params: Dict[str, Any], notification: Dict[Any, Any]
-  ) -> Tuple[httplib2.Response, Text]:
+  ) -> Tuple[requests.Response, Text]:
     """Sends a http request to a 3rd-party service via a http request."""
     http_url = self._GetHttpUrl(config_params, notification)
     messages_headers = self._BuildHttpRequestHeaders(
@@ -166,63 +316,71 @@ class HttpRequestBasedHandler(ServiceHandler, abc.ABC):
     )
     message_body = self._BuildHttpRequestBody(config_params, notification)
 
-    http_obj = httplib2.Http()
-
-    # content is a bytes object.
-    http_response, content = http_obj.request(
-        uri=http_url,
-        method=self._http_method,
-        headers=messages_headers,
-        body=message_body,
-    )
-    return http_response, content.decode("utf-8")
+    _CIRCUIT_BREAKER.BeforeRequest(http_url)
+    try:
+      http_response = _HTTP_SESSION.request(
+          method=self._http_method,
+          url=http_url,
+          headers=messages_headers,
+          data=message_body,
+          timeout=_HTTP_TIMEOUT_SEC,
+      )
+    except Exception:
+      _CIRCUIT_BREAKER.RecordFailure(http_url)
+      raise
+    if http_response.status_code >= 500:
+      _CIRCUIT_BREAKER.RecordFailure(http_url)
+    else:
+      _CIRCUIT_BREAKER.RecordSuccess(http_url)
+    # The response content is a bytes object.
+    return http_response, http_response.content.decode("utf-8")
 
 
-class GchatHandler(HttpRequestBasedHandler):
-  """Handler that integrates the Google alerting pubsub channel with the Google Chat service.
+class WebhookHandler(HttpRequestBasedHandler, abc.ABC):
+  """Abstract base class for handlers that send json messages to a webhook URL.
 
-  It converts a received notification into a well-formatted Google Chat message
-  and sends it to the configured Google Chat room. The config parameter it needs
-  is the Google chat room webhook URL.
+  The config parameters it needs are the webhook URL and the message format.
   """
 
-  # The handler supports two formats: text and card, see
-  # https://developers.google.com/chat/api/guides/message-formats/basic
-  # and https://developers.google.com/chat/api/guides/message-formats/cards
-  _SUPPORTED_FORMAT = set(["text", "card"])
-  _OPEN_ISSUE_HEADER_COLOR = "#FF0000"  # Red for open issues.
-  _CLOSED_ISSUE_HEADER_COLOR = "#0000FF"  # Blue for closed issues.
-  _GCHAT_SERVICE_NAME = "google_chat"
-  _GCHAT_HTTP_METHOD = "POST"
+  __slots__ = ("_body_builders",)
+
+  _SUPPORTED_FORMAT = frozenset(["text", "card"])
   _URL_PARAM_NAME = "webhook_url"
   _FORMAT_PARAM_NAME = "msg_format"
+  # The text message, whose text is the json dump of the notification.
+  _TEXT_TEMPLATE = _JsonTemplate({"text": "@@text@@"})
 
-  def __init__(self):
-    super(GchatHandler, self).__init__(
-        self._GCHAT_SERVICE_NAME, self._GCHAT_HTTP_METHOD
-    )
+  def __init__(self, service_name: Text, http_method: Text):
+    super(WebhookHandler, self).__init__(service_name, http_method)
+    # Maps each supported message format to the method that builds its body,
+    # so that the format is dispatched with a single lookup per notification.
+    self._body_builders = {
+        "text": self._BuildTextMessageBody,
+        "card": self._BuildCardMessageBody,
+    }
 
   def CheckConfigParams(self, config_params: Dict[Text, Any]):
     """Checks if the given config params is a valid one that has all the necessary configs.
 
-    The google chat handler needs the webhook url of a google chat room and the
-    format setting to forward the notifications.
+    The webhook handlers need the webhook url and the format setting to forward
+    the notifications.
+
+    Args:
+        config_params: A dictionary that includes information about where/how to
+          send notifications to a 3rd-party service.
+
+    Raises:
+        ConfigParamsError: If config parameters are invalid.
     """
     self.CheckServiceNameInConfigParams(config_params)
 
-    # The google chat room webhook url is needed to send the requests.
-    if not (
-        self._URL_PARAM_NAME in config_params
-        and isinstance(config_params[self._URL_PARAM_NAME], str)
-    ):
+    # The webhook url is needed to send the requests.
+    if not isinstance(config_params.get(self._URL_PARAM_NAME), str):
       raise ConfigParamsError(
           f"{self._URL_PARAM_NAME} is not set or not a string: {config_params}"
       )
 
-    if not (
-        self._FORMAT_PARAM_NAME in config_params
-        and config_params[self._FORMAT_PARAM_NAME] in self._SUPPORTED_FORMAT
-    ):
+    if config_params.get(self._FORMAT_PARAM_NAME) not in self._SUPPORTED_FORMAT:
       raise ConfigParamsError(
           f"{self._FORMAT_PARAM_NAME} is not set or not a valid option:"
           f" {config_params}"
@@ -236,132 +394,335 @@ class GchatHandler(HttpRequestBasedHandler):
   def _BuildHttpRequestHeaders(
       self, config_params: Dict[Text, Any], notification: Dict[Any, Any]
   ) -> Dict[Text, Any]:
-    http_headers = {"Content-Type": "application/json; charset=UTF-8"}
-    return http_headers
+    return _JSON_HTTP_HEADERS
 
   def _BuildHttpRequestBody(
       self, config_params: Dict[Text, Any], notification: Dict[Any, Any]
-  ) -> Text:
-    msg_format = config_params["msg_format"]
-    """Converts the notification into a http request body."""
-    if msg_format == "text":
-      message_body = {"text": json.dumps(notification)}
-      return json.dumps(message_body)
-
-    assert msg_format == "card"
-    try:
-      started_time = notification["incident"].get("started_at")
-      if started_time:
-        started_time = datetime.datetime.utcfromtimestamp(int(started_time))
-        started_time_str = started_time.strftime("%Y-%m-%d %H:%M:%S (UTC)")
-      else:
-        started_time_str = ""
+  ) -> bytes:
+    """Converts the notification into a message of the configured format."""
+    build_body = self._body_builders[config_params[self._FORMAT_PARAM_NAME]]
+    return build_body(notification)
+
+  def _BuildTextMessageBody(self, notification: Dict[Any, Any]) -> bytes:
+    """Builds the body of a text message that shows the whole notification."""
+    return self._TEXT_TEMPLATE.Render(
+        {"text": fast_json.Dumps(notification).decode("utf-8")}
+    )
 
-      incident_display_name = notification["incident"]["condition"][
-          "displayName"
-      ]
-      incident_resource_labels = notification["incident"]["resource"]["labels"]
-      incident_url = notification["incident"]["url"]
-      incident_state = notification["incident"]["state"]
-      header_color = self._CLOSED_ISSUE_HEADER_COLOR
-      if incident_state == "open":
-        header_color = self._OPEN_ISSUE_HEADER_COLOR
+  @abc.abstractmethod
+  def _BuildCardMessageBody(self, notification: Dict[Any, Any]) -> bytes:
+    """Builds the body of a card message that summarizes the notification.
 
-      incident_ended_at = notification["incident"].get("ended_at")
-      if incident_ended_at:
-        incident_ended_at = datetime.datetime.utcfromtimestamp(
-            int(incident_ended_at)
-        )
-      else:
-        incident_ended_at = ""
-      incident_summary = notification["incident"]["summary"]
-    except:
-      logging.error("failed to get notification fields %s", notification)
-      raise
+    Args:
+        notification: An incoming alerting message to forward.
 
-    # Set the alert severity level if it is set in the user labels.
-    try:
-      incident_severity = notification["incident"]["policy_user_labels"][
-          "severity"
-      ]
-      incident_severity_display_str = (
-          f', <br><b><font color="{header_color}">Severity:</font></b>'
-          f" {incident_severity}"
-      )
-    except:
-      logging.error(
-          f"Failed to extract the severity level info : {notification}"
-      )
-      incident_severity_display_str = ""
+    Returns:
+        A UTF-8 encoded json dump of the created message json object.
 
-    message_body = {
-        "cards": [{
-            "sections": [{
-                "widgets": [
-                    {
-                        "textParagraph": {
-                            "text": (
-                                "<b><font"
-                                ' color="{header_color}">Summary:</font></b>'
-                                f" {incident_summary}, <br><b><font"
-                                f' color="{header_color}">State:</font></b>'
-                                f" {incident_state}{incident_severity_display_str}"
-                            )
-                        }
-                    },
-                    {
-                        "textParagraph": {
-                            "text": (
-                                "<b>Condition Display Name:</b>"
-                                f" {incident_display_name} <br><b>Start at:</b>"
-                                f" {started_time_str}<br><b>Incident"
-                                f" Labels:</b> {incident_resource_labels}"
-                            )
-                        }
-                    },
-                    {
-                        "buttons": [{
-                            "textButton": {
-                                "text": "View Incident Details",
-                                "onClick": {
-                                    "openLink": {"url": f"{incident_url}"}
-                                },
-                            }
-                        }]
-                    },
-                ]
-            }]
-        }]
-    }
-    return json.dumps(message_body)
+    Raises:
+        Any exception raised during the process.
+    """
+    pass
 
   def SendNotification(
       self, config_params: Dict[Text, Any], notification: Dict[Any, Any]
   ) -> Tuple[Text, int]:
-    """Sends a notification to a Google chat room."""
+    """Sends a notification to the configured webhook."""
     try:
       self.CheckConfigParams(config_params)
     except ConfigParamsError as err:
       logging.error("Failed to send the notification: %s", err)
       return str(err), 400
-    except BaseException as err:
+    except Exception as err:  # pylint: disable=broad-except
       logging.error("Failed to send the notification: %s", err)
       return str(err), 500
 
     try:
       logging.info("Sending the notification: %s", notification)
-      # content is of type bytes.
       http_response, content = self._SendHttpRequest(
           config_params, notification
       )
       logging.info("Successfully sent the notification: %s", http_response)
-    except BaseException as err:
+    except CircuitOpenError as err:
+      # The service is unavailable for now, so the notification can be sent
+      # again later.
+      logging.error("Failed to send the notification: %s", err)
+      return str(err), 503
+    except Exception as err:  # pylint: disable=broad-except
       logging.error("Failed to send the notification: %s", err)
       return str(err), 500
-    return content, http_response.status
+    return content, http_response.status_code
 
 
-class MSTeamsHandler(HttpRequestBasedHandler):
+class GchatHandler(WebhookHandler):
+  """Handler that integrates the Google alerting pubsub channel with the Google Chat service.
+
+  It converts a received notification into a well-formatted Google Chat message
+  and sends it to the configured Google Chat room. The config parameter it needs
+  is the Google chat room webhook URL.
+  """
+
+  __slots__ = ()
+
+  # The handler supports two formats: text and card, see
+  # https://developers.google.com/chat/api/guides/message-formats/basic
+  # and https://developers.google.com/chat/api/guides/message-formats/cards
+  _OPEN_ISSUE_HEADER_COLOR = "#FF0000"  # Red for open issues.
+  _CLOSED_ISSUE_HEADER_COLOR = "#0000FF"  # Blue for closed issues.
+  _GCHAT_SERVICE_NAME = "google_chat"
+  _GCHAT_HTTP_METHOD = "POST"
+  # The texts of the two card paragraphs, filled in with str.format_map.
+  _SUMMARY_TEMPLATE = (
+      '<b><font color="{color}">Summary:</font></b> {summary}, <br><b><font'
+      ' color="{color}">State:</font></b> {state}{severity}'
+  )
+  _SEVERITY_TEMPLATE = (
+      ', <br><b><font color="{color}">Severity:</font></b> {severity}'
+  )
+  _DETAILS_TEMPLATE = (
+      "<b>Condition Display Name:</b> {display_name} <br><b>Start at:</b>"
+      " {started_at}<br><b>Incident Labels:</b> {labels}"
+  )
+  # The card message, see
+  # https://developers.google.com/chat/api/guides/message-formats/cards
+  _CARD_TEMPLATE = _JsonTemplate({
+      "cards": [{
+          "sections": [{
+              "widgets": [
+                  {"textParagraph": {"text": "@@summary_text@@"}},
+                  {"textParagraph": {"text": "@@details_text@@"}},
+                  {
+                      "buttons": [{
+                          "textButton": {
+                              "text": "View Incident Details",
+                              "onClick": {
+                                  "openLink": {"url": "@@incident_url@@"}
+                              },
+                          }
+                      }]
+                  },
+              ]
+          }]
+      }]
+  })
+
+  def __init__(self):
+    super(GchatHandler, self).__init__(
+        self._GCHAT_SERVICE_NAME, self._GCHAT_HTTP_METHOD
+    )
+
+  def _BuildCardMessageBody(self, notification: Dict[Any, Any]) -> bytes:
+    try:
+      incident = notification["incident"]
+      started_time = incident.get("started_at")
+      if started_time:
+        started_time_str = _FormatUtcTimestamp(int(started_time))
+      else:
+        started_time_str = ""
+
+      incident_display_name = incident["condition"]["displayName"]
+      incident_resource_labels = incident["resource"]["labels"]
+      incident_url = incident["url"]
+      incident_state = incident["state"]
+      header_color = self._CLOSED_ISSUE_HEADER_COLOR
+      if incident_state == "open":
+        header_color = self._OPEN_ISSUE_HEADER_COLOR
+
+      incident_summary = incident["summary"]
+    except:
+      logging.error("failed to get notification fields %s", notification)
+      raise
+
+    # Set the alert severity level if it is set in the user labels. Most
+    # policies do not set it, so it is looked up without raising an exception.
+    policy_user_labels = incident.get("policy_user_labels")
+    incident_severity = None
+    if isinstance(policy_user_labels, dict):
+      incident_severity = policy_user_labels.get("severity")
+    if incident_severity is None:
+      incident_severity_display_str = ""
+    else:
+      incident_severity_display_str = self._SEVERITY_TEMPLATE.format_map(
+          {"color": header_color, "severity": incident_severity}
+      )
+
+    return self._CARD_TEMPLATE.Render({
+        "summary_text": self._SUMMARY_TEMPLATE.format_map({
+            "color": header_color,
+            "summary": incident_summary,
+            "state": incident_state,
+            "severity": incident_severity_display_str,
+        }),
+        "details_text": self._DETAILS_TEMPLATE.format_map({
+            "display_name": incident_display_name,
+            "started_at": started_time_str,
+            "labels": incident_resource_labels,
+        }),
+        "incident_url": f"{incident_url}",
+    })
+
+
+def _MSTeamsAdaptiveCard(include_documentation: bool) -> Dict[Text, Any]:
+  """Returns the Microsoft Teams adaptive card message template.
+
+  See _JsonTemplate for its "@@field_name@@" fields.
+
+  Args:
+      include_documentation: Whether the card has the documentation section.
+  """
+  # Construct the adaptive card body
+  card_body = [
+      {
+          "type": "Container",
+          "items": [
+              {
+                  "type": "TextBlock",
+                  "text": "@@policy_name@@",
+                  "weight": "Bolder",
+                  "size": "Medium",
+              },
+              {
+                  "type": "TextBlock",
+                  "text": "@@summary@@",
+                  "isSubtle": True,
+                  "wrap": True,
+              },
+              {
+                  "type": "ColumnSet",
+                  "columns": [
+                      {
+                          "type": "Column",
+                          "width": "auto",
+                          "items": [{
+                              "type": "Image",
+                              "url": "@@state_image@@",
+                              "width": "18px",
+                              "height": "18px",
+                              "spacing": "None",
+                          }],
+                      },
+                      {
+                          "type": "Column",
+                          "width": "auto",
+                          "items": [{
+                              "type": "TextBlock",
+                              "text": "@@state@@",
+                              "color": "@@state_color@@",
+                              "size": "Small",
+                              "spacing": "None",
+                              "wrap": True,
+                          }],
+                      },
+                      {
+                          "type": "Column",
+                          "width": "auto",
+                          "items": [{
+                              "type": "Image",
+                              "url": "@@severity_image@@",
+                              "width": "18px",
+                              "height": "18px",
+                              "spacing": "None",
+                          }],
+                      },
+                      {
+                          "type": "Column",
+                          "width": "auto",
+                          "items": [{
+                              "type": "TextBlock",
+                              "text": "@@severity@@",
+                              "size": "Small",
+                              "weight": "Default",
+                              "spacing": "Small",
+                              "wrap": True,
+                          }],
+                      },
+                  ],
+              },
+          ],
+      },
+      {
+          "type": "ActionSet",
+          "actions": [
+              {
+                  "type": "Action.OpenUrl",
+                  "title": "View alert",
+                  "url": "@@url@@",
+                  "isPrimary": True,
+              },
+              {
+                  "type": "Action.ShowCard",
+                  "title": "Additional details",
+                  "card": {
+                      "type": "AdaptiveCard",
+                      "body": [{
+                          "type": "Container",
+                          "items": [
+                              {
+                                  "type": "TextBlock",
+                                  "text": "Additional details",
+                                  "weight": "Bolder",
+                                  "size": "Medium",
+                              },
+                              {
+                                  "type": "TextBlock",
+                                  "text": "@@quick_links@@",
+                                  "wrap": True,
+                                  "separator": "@@quick_links_separator@@",
+                              },
+                              {
+                                  "type": "TextBlock",
+                                  "text": "Labels",
+                                  "size": "Small",
+                                  "weight": "Bolder",
+                                  "spacing": "Large",
+                              },
+                              {
+                                  "type": "FactSet",
+                                  "facts": "@@facts@@",
+                                  "spacing": "Small",
+                              },
+                          ],
+                      }],
+                  },
+              },
+          ],
+      },
+  ]
+
+  # Add documentation section if needed
+  if include_documentation:
+    card_body[1]["actions"][1]["card"]["body"][0]["items"].extend([
+        {
+            "type": "TextBlock",
+            "text": "Documentation",
+            "size": "Small",
+            "weight": "Bolder",
+            "spacing": "Large",
+        },
+        {
+            "type": "TextBlock",
+            "text": "@@documentation@@",
+            "spacing": "Small",
+            "wrap": True,
+        },
+    ])
+
+  return {
+      "type": "message",
+      "attachments": [{
+          "contentType": "application/vnd.microsoft.card.adaptive",
+          "contentUrl": None,
+          "content": {
+              "type": "AdaptiveCard",
+              "body": card_body,
+              "$schema": "http://adaptivecards.io/schemas/adaptive-card.json",
+              "version": "1.5",
+          },
+      }],
+  }
+
+
+class MSTeamsHandler(WebhookHandler):
   """Handler that integrates the Google alerting pubsub channel with the Microsoft Teams service.
 
   It converts a received notification into a well-formatted Microsoft Teams
@@ -369,64 +730,37 @@ class MSTeamsHandler(HttpRequestBasedHandler):
   parameter it needs is the Microsoft Teams channel webhook URL.
   """
 
+  __slots__ = ()
+
   # The handler supports microsoft teams text and card formats,
   # see https://learn.microsoft.com/en-us/microsoftteams/platform/webhooks-and
   # -connectors/how-to/connectors-using?tabs=cURL%2Ctext1#send-messages-using-curl-and-powershell
   # and https://learn.microsoft.com/en-us/microsoftteams/platform/webhooks-and
   # -connectors/how-to/add-incoming-webhook?tabs=newteams%2Cdotnet#format-the-message
-  _SUPPORTED_FORMAT = {"text", "card"}
   _TEAMS_SERVICE_NAME = "microsoft_teams"
   _TEAMS_HTTP_METHOD = "POST"
-  _URL_PARAM_NAME = "webhook_url"
-  _FORMAT_PARAM_NAME = "msg_format"
+  _SEVERITY_IMAGES = {
+      "Critical": (
+          "https://ssl.gstatic.com/cloud-monitoring/severity_critical.png"
+      ),
+      "Error": "https://ssl.gstatic.com/cloud-monitoring/severity_error.png",
+      "Warning": (
+          "https://ssl.gstatic.com/cloud-monitoring/severity_warning.png"
+      ),
+      "No severity": (
+          "https://ssl.gstatic.com/cloud-monitoring/severity_null.png"
+      ),
+  }
+  _CARD_TEMPLATE = _JsonTemplate(
+      _MSTeamsAdaptiveCard(include_documentation=False)
+  )
+  _CARD_WITH_DOCUMENTATION_TEMPLATE = _JsonTemplate(
+      _MSTeamsAdaptiveCard(include_documentation=True)
+  )
 
   def __init__(self):
     super().__init__(self._TEAMS_SERVICE_NAME, self._TEAMS_HTTP_METHOD)
 
-  def CheckConfigParams(self, config_params: Dict[str, Any]):
-    """Checks if the given config params is a valid one that has all the necessary configs.
-
-    The Microsoft Teams handler needs the webhook url of a Microsoft Teams
-    channel and the format setting to forward the notifications.
-
-    Args:
-        config_params: A dictionary that includes information about where/how to
-          send notifications to a 3rd-party service.
-
-    Raises:
-        ConfigParamsError: If config parameters are invalid.
-    """
-    self.CheckServiceNameInConfigParams(config_params)
-
-    # The Microsoft Teams channel webhook url is needed to send the requests.
-    if not (
-        self._URL_PARAM_NAME in config_params
-        and isinstance(config_params[self._URL_PARAM_NAME], str)
-    ):
-      raise ConfigParamsError(
-          f"{self._URL_PARAM_NAME} is not set or not a string: {config_params}"
-      )
-
-    if not (
-        self._FORMAT_PARAM_NAME in config_params
-        and config_params[self._FORMAT_PARAM_NAME] in self._SUPPORTED_FORMAT
-    ):
-      raise ConfigParamsError(
-          f"{self._FORMAT_PARAM_NAME} is not set or not a valid option:"
-          f" {config_params}"
-      )
-
-  def _GetHttpUrl(
-      self, config_params: Dict[str, Any], notification: Dict[Any, Any]
-  ) -> str:
-    return config_params[self._URL_PARAM_NAME]
-
-  def _BuildHttpRequestHeaders(
-      self, config_params: Dict[str, Any], notification: Dict[Any, Any]
-  ) -> Dict[str, Any]:
-    http_headers = {"Content-Type": "application/json; charset=UTF-8"}
-    return http_headers
-
   def _GetAllLabels(self, incident: Dict[str, Any]) -> Dict[str, str]:
     """Gets all resource, metric, and metadata labels from the incident."""
     resource_labels = incident.get("resource", {}).get("labels", {})
@@ -444,16 +778,7 @@ class MSTeamsHandler(HttpRequestBasedHandler):
 
     return all_labels
 
-  def _BuildHttpRequestBody(
-      self, config_params: Dict[str, Any], notification: Dict[Any, Any]
-  ) -> str:
-    msg_format = config_params.get("msg_format", "text")
-
-    if msg_format == "text":
-      message_body = {"text": json.dumps(notification)}
-      return json.dumps(message_body)
-
-    assert msg_format == "card"
+  def _BuildCardMessageBody(self, notification: Dict[Any, Any]) -> bytes:
     try:
       incident = notification.get("incident", {})
       quick_links = incident.get("documentation", {}).get("links", "N/A")
@@ -479,20 +804,7 @@ class MSTeamsHandler(HttpRequestBasedHandler):
         if incident_state == "open"
         else "https://ssl.gstatic.com/cloud-monitoring/incident_closed.png"
     )
-    severity_images = {
-        "Critical": (
-            "https://ssl.gstatic.com/cloud-monitoring/severity_critical.png"
-        ),
-        "Error": "https://ssl.gstatic.com/cloud-monitoring/severity_error.png",
-        "Warning": (
-            "https://ssl.gstatic.com/cloud-monitoring/severity_warning.png"
-        ),
-        "No severity": (
-            "https://ssl.gstatic.com/cloud-monitoring/severity_null.png"
-        ),
-    }
-
-    severity_image = severity_images.get(
+    severity_image = self._SEVERITY_IMAGES.get(
         severity,
         "https://ssl.gstatic.com/cloud-monitoring/severity_null.png",
     )
@@ -512,196 +824,21 @@ class MSTeamsHandler(HttpRequestBasedHandler):
     fact_set.append({"title": "metric_type", "value": metric_type})
     fact_set = sorted(fact_set, key=lambda x: x["title"])
 
-    # Construct the adaptive card body
-    card_body = [
-        {
-            "type": "Container",
-            "items": [
-                {
-                    "type": "TextBlock",
-                    "text": "{{policy_name}}",
-                    "weight": "Bolder",
-                    "size": "Medium",
-                },
-                {
-                    "type": "TextBlock",
-                    "text": "{{summary}}",
-                    "isSubtle": True,
-                    "wrap": True,
-                },
-                {
-                    "type": "ColumnSet",
-                    "columns": [
-                        {
-                            "type": "Column",
-                            "width": "auto",
-                            "items": [{
-                                "type": "Image",
-                                "url": "{{state_image}}",
-                                "width": "18px",
-                                "height": "18px",
-                                "spacing": "None",
-                            }],
-                        },
-                        {
-                            "type": "Column",
-                            "width": "auto",
-                            "items": [{
-                                "type": "TextBlock",
-                                "text": "{{state}}",
-                                "color": "{{state_color}}",
-                                "size": "Small",
-                                "spacing": "None",
-                                "wrap": True,
-                            }],
-                        },
-                        {
-                            "type": "Column",
-                            "width": "auto",
-                            "items": [{
-                                "type": "Image",
-                                "url": "{{severity_image}}",
-                                "width": "18px",
-                                "height": "18px",
-                                "spacing": "None",
-                            }],
-                        },
-                        {
-                            "type": "Column",
-                            "width": "auto",
-                            "items": [{
-                                "type": "TextBlock",
-                                "text": "{{severity}}",
-                                "size": "Small",
-                                "weight": "Default",
-                                "spacing": "Small",
-                                "wrap": True,
-                            }],
-                        },
-                    ],
-                },
-            ],
-        },
-        {
-            "type": "ActionSet",
-            "actions": [
-                {
-                    "type": "Action.OpenUrl",
-                    "title": "View alert",
-                    "url": "{{url}}",
-                    "isPrimary": True,
-                },
-                {
-                    "type": "Action.ShowCard",
-                    "title": "Additional details",
-                    "card": {
-                        "type": "AdaptiveCard",
-                        "body": [{
-                            "type": "Container",
-                            "items": [
-                                {
-                                    "type": "TextBlock",
-                                    "text": "Additional details",
-                                    "weight": "Bolder",
-                                    "size": "Medium",
-                                },
-                                {
-                                    "type": "TextBlock",
-                                    "text": quick_links_string,
-                                    "wrap": True,
-                                    "separator": (
-                                        True if quick_links_string else False
-                                    ),
-                                },
-                                {
-                                    "type": "TextBlock",
-                                    "text": "Labels",
-                                    "size": "Small",
-                                    "weight": "Bolder",
-                                    "spacing": "Large",
-                                },
-                                {
-                                    "type": "FactSet",
-                                    "facts": fact_set,
-                                    "spacing": "Small",
-                                },
-                            ],
-                        }],
-                    },
-                },
-            ],
-        },
-    ]
-
-    # Add documentation section if not empty
     if documentation.strip() and documentation != "N/A":
-      card_body[1]["actions"][1]["card"]["body"][0]["items"].extend([
-          {
-              "type": "TextBlock",
-              "text": "Documentation",
-              "size": "Small",
-              "weight": "Bolder",
-              "spacing": "Large",
-          },
-          {
-              "type": "TextBlock",
-              "text": "{{documentation}}",
-              "spacing": "Small",
-              "wrap": True,
-          },
-      ])
-
-    adaptive_card_template = {
-        "type": "message",
-        "attachments": [{
-            "contentType": "application/vnd.microsoft.card.adaptive",
-            "contentUrl": None,
-            "content": {
-                "type": "AdaptiveCard",
-                "body": card_body,
-                "$schema": "http://adaptivecards.io/schemas/adaptive-card.json",
-                "version": "1.5",
-            },
-        }],
-    }
-
-    # Replace placeholders with actual data
-    message_body = (
-        json.dumps(adaptive_card_template)
-        .replace("{{policy_name}}", policy_name)
-        .replace("{{summary}}", incident.get("summary", "N/A"))
-        .replace("{{state_image}}", state_image)
-        .replace("{{state}}", incident_state)
-        .replace("{{state_color}}", state_color)
-        .replace("{{severity_image}}", severity_image)
-        .replace("{{severity}}", severity)
-        .replace("{{url}}", incident_url)
-        .replace("{{documentation}}", documentation)
-    )
-
-    return message_body
-
-  def SendNotification(
-      self, config_params: Dict[str, Any], notification: Dict[Any, Any]
-  ) -> Tuple[str, int]:
-    """Sends a notification to a Microsoft Teams Channel."""
-    try:
-      self.CheckConfigParams(config_params)
-    except ConfigParamsError as err:
-      logging.error("Failed to send the notification: %s", err)
-      return str(err), 400
-    except Exception as err:  # pylint: disable=broad-except
-      logging.error("Failed to send the notification: %s", err)
-      return str(err), 500
-
-    try:
-      logging.info("Sending the notification: %s", notification)
-      # content is of type bytes.
-      http_response, content = self._SendHttpRequest(
-          config_params, notification
-      )
-      logging.info("Successfully sent the notification: %s", http_response)
-    except Exception as err:  # pylint: disable=broad-except
-      logging.error("Failed to send the notification: %s", err)
-      return str(err), 500
-    return content, http_response.status
+      card_template = self._CARD_WITH_DOCUMENTATION_TEMPLATE
+    else:
+      card_template = self._CARD_TEMPLATE
+    return card_template.Render({
+        "policy_name": policy_name,
+        "summary": incident.get("summary", "N/A"),
+        "state_image": state_image,
+        "state": incident_state,
+        "state_color": state_color,
+        "severity_image": severity_image,
+        "severity": severity,
+        "url": incident_url,
+        "quick_links": quick_links_string,
+        "quick_links_separator": bool(quick_links_string),
+        "facts": fact_set,
+        "documentation": documentation,
+    })
@@ -17,13 +17,15 @@ import copy
 import json
 import unittest
 from unittest import mock
-import httplib2
+from urllib3.util import retry
 from utilities import service_handler
 
 # A valid config map used in the tests.
 _SERVICE_NAME_GCHAT = 'google_chat'
 _SERVICE_NAME_TEAMS = 'microsoft_teams'
 _HTTP_METHOD = 'POST'
+# The default ack deadline of the Pub/Sub push subscriptions.
+_PUBSUB_ACK_DEADLINE_SEC = 10
 _CONFIG_PARAMS_GCHAT = {
     'service_name': _SERVICE_NAME_GCHAT,
     'webhook_url': 'https://chat.123.com',
@@ -51,9 +53,12 @@ _BAD_CONFIG_PARAMS_GCHAT = [
         'msg_format': 'video',
     },  # Bad format value
 ]
-_BAD_CONFIG_PARAMS_TEAMS = [
+_BAD_SERVICE_NAME_CONFIG_PARAMS_TEAMS = [
     {'service': _SERVICE_NAME_TEAMS},  # Bad service name key
     {'service_name': 'wrong_xxx'},  # Bad service name value
+    {},  # Missing service name
+]
+_BAD_CONFIG_PARAMS_TEAMS = _BAD_SERVICE_NAME_CONFIG_PARAMS_TEAMS + [
     {'service_name': 'microsoft_teams', 'url': '123.com'},  # Bad url key
     {'service_name': 'microsoft_teams', 'webhook_url': 123},  # Bad url value
     {
@@ -66,7 +71,6 @@ _BAD_CONFIG_PARAMS_TEAMS = [
         'webhook_url': '123.com',
         'msg_format': 'video',
     },  # Bad format value
-    {},  # Missing service name
 ]
 
 
@@ -118,6 +122,16 @@ _NOTIF = {
 }
 
 
+def _HttpResponse(status_code, content):
+  """Creates a mock of the requests.Response returned by the http session."""
+  return mock.Mock(status_code=status_code, content=content)
+
+
+def _SentJsonBody(http_obj_mock):
+  """Returns the parsed json body of the last request sent by the session."""
+  return json.loads(http_obj_mock.request.call_args.kwargs['data'])
+
+
 class ServiceHandlerTest(unittest.TestCase):
 
   def testAbstractServiceHandlerCannotBeInitialized(self):
@@ -132,13 +146,88 @@ class HttpRequestBasedHandlerTest(unittest.TestCase):
       service_handler.HttpRequestBasedHandler(_SERVICE_NAME_GCHAT, _HTTP_METHOD)  # pylint: disable=abstract-class-instantiated
 
 
+class HttpSettingsTest(unittest.TestCase):
+
+  def testSendTimeIsWithinPubSubAckDeadline(self):
+    http_retry = service_handler._HTTP_RETRY
+    attempts = http_retry.total + 1
+    # The backoff before each retry, given the previous failed attempts.
+    backoff_sec = sum(
+        http_retry.new(
+            history=tuple(
+                retry.RequestHistory(_HTTP_METHOD, '/', None, 503, None)
+                for _ in range(failed_attempts)
+            )
+        ).get_backoff_time()
+        for failed_attempts in range(1, attempts)
+    )
+    max_send_sec = (
+        attempts * sum(service_handler._HTTP_TIMEOUT_SEC) + backoff_sec
+    )
+    self.assertLess(max_send_sec, _PUBSUB_ACK_DEADLINE_SEC)
+
+  def testReadTimeoutsNotRetried(self):
+    self.assertEqual(service_handler._HTTP_RETRY.read, 0)
+
+
+class FormatUtcTimestampTest(unittest.TestCase):
+
+  def testFormatUtcTimestamp(self):
+    for timestamp, expected_str in [
+        (0, '1970-01-01 00:00:00 (UTC)'),
+        (1620754533, '2021-05-11 17:35:33 (UTC)'),
+        (1709164800, '2024-02-29 00:00:00 (UTC)'),
+    ]:
+      self.assertEqual(
+          service_handler._FormatUtcTimestamp(timestamp), expected_str
+      )
+
+
+class JsonTemplateTest(unittest.TestCase):
+
+  def testRenderSucceed(self):
+    template = service_handler._JsonTemplate(
+        {'text': '@@text@@', 'items': ['@@items@@', {'url': '@@url@@'}]}
+    )
+    body = template.Render({
+        'text': 'State: "open" @@url@@',
+        'items': [1, {'a': None}],
+        'url': 'https://123.com/?a=1&b=\u00e9',
+    })
+    self.assertEqual(
+        json.loads(body),
+        {
+            'text': 'State: "open" @@url@@',
+            'items': [
+                [1, {'a': None}],
+                {'url': 'https://123.com/?a=1&b=\u00e9'},
+            ],
+        },
+    )
+
+  def testRenderMissingValue(self):
+    template = service_handler._JsonTemplate({'text': '@@text@@'})
+    with self.assertRaises(KeyError):
+      template.Render({})
+
+
 class GchatHandlerTest(unittest.TestCase):
 
   def setUp(self):
     super().setUp()
     self._http_obj_mock = mock.Mock()
-    self._http_mock = mock.Mock(return_value=self._http_obj_mock)
-    httplib2.Http = self._http_mock
+    patcher = mock.patch.object(
+        service_handler, '_HTTP_SESSION', self._http_obj_mock
+    )
+    patcher.start()
+    self.addCleanup(patcher.stop)
+    patcher = mock.patch.object(
+        service_handler,
+        '_CIRCUIT_BREAKER',
+        service_handler._CircuitBreaker(fail_max=2, reset_timeout_sec=30),
+    )
+    patcher.start()
+    self.addCleanup(patcher.stop)
 
   def testCheckServiceNameInConfigParamsFailed(self):
     handler = service_handler.GchatHandler()
@@ -177,57 +266,69 @@ class GchatHandlerTest(unittest.TestCase):
     self.assertEqual(status_code, 500)
     self._http_obj_mock.request.assert_called_once()
 
+  def testSendNotificationRejectedWhenCircuitOpen(self):
+    handler = service_handler.GchatHandler()
+    self._http_obj_mock.request.side_effect = Exception('connection timeout')
+    for _ in range(2):
+      _, status_code = handler.SendNotification(_CONFIG_PARAMS_GCHAT, _NOTIF)
+      self.assertEqual(status_code, 500)
+    self.assertEqual(self._http_obj_mock.request.call_count, 2)
+
+    # The circuit is open after 2 consecutive failures.
+    self._http_obj_mock.request.side_effect = None
+    self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
+    response, status_code = handler.SendNotification(
+        _CONFIG_PARAMS_GCHAT, _NOTIF
+    )
+    self.assertEqual(status_code, 503)
+    self.assertIn('Requests are rejected', response)
+    self.assertEqual(self._http_obj_mock.request.call_count, 2)
+
+  def testSendNotificationCircuitClosedAfterSuccessfulTrial(self):
+    handler = service_handler.GchatHandler()
+    with mock.patch.object(
+        service_handler,
+        '_CIRCUIT_BREAKER',
+        service_handler._CircuitBreaker(fail_max=2, reset_timeout_sec=0),
+    ):
+      # Server errors are failures too.
+      self._http_obj_mock.request.return_value = _HttpResponse(503, b'')
+      for _ in range(2):
+        _, status_code = handler.SendNotification(_CONFIG_PARAMS_GCHAT, _NOTIF)
+        self.assertEqual(status_code, 503)
+
+      # The reset timeout has passed, so the trial request is sent.
+      self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
+      for _ in range(2):
+        _, status_code = handler.SendNotification(_CONFIG_PARAMS_GCHAT, _NOTIF)
+        self.assertEqual(status_code, 200)
+      self.assertEqual(self._http_obj_mock.request.call_count, 4)
+
   def testSendNotificationFormatTextSucceed(self):
     handler = service_handler.GchatHandler()
     config_params = _CONFIG_PARAMS_GCHAT.copy()
     config_params['msg_format'] = 'text'
-    self._http_obj_mock.request.return_value = (
-        httplib2.Response({'status': 200}),
-        b'OK',
-    )
+    self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
     http_response, status_code = handler.SendNotification(config_params, _NOTIF)
     self.assertEqual(status_code, 200)
-    expected_body = (
-        '{"text": "{\\"incident\\": {\\"condition\\":'
-        ' {\\"conditionThreshold\\": {\\"aggregations\\":'
-        ' [{\\"alignmentPeriod\\": \\"60s\\", \\"crossSeriesReducer\\":'
-        ' \\"REDUCE_SUM\\", \\"perSeriesAligner\\": \\"ALIGN_SUM\\"}],'
-        ' \\"comparison\\": \\"COMPARISON_GT\\", \\"duration\\": \\"60s\\",'
-        ' \\"filter\\":'
-        ' \\"metric.type=\\\\\\"compute.googleapis.com/instance/cpu/usage_time\\\\\\"'
-        ' AND resource.type=\\\\\\"gce_instance\\\\\\"\\", \\"trigger\\":'
-        ' {\\"count\\": 1}}, \\"displayName\\": \\"test condition\\",'
-        ' \\"name\\":'
-        ' \\"projects/tf-test/alertPolicies/3528831492076541324/conditions/3528831492076543949\\"},'
-        ' \\"condition_name\\": \\"test condition\\", \\"ended_at\\":'
-        ' 1621359336, \\"incident_id\\": \\"0.m2d61b3s6d5d\\", \\"metric\\":'
-        ' {\\"displayName\\": \\"CPU usage\\", \\"type\\":'
-        ' \\"compute.googleapis.com/instance/cpu/usage_time\\"},'
-        ' \\"policy_name\\": \\"test Alert Policy\\", \\"resource\\":'
-        ' {\\"labels\\": {\\"project_id\\": \\"tf-test\\"}, \\"type\\":'
-        ' \\"gce_instance\\"}, \\"resource_id\\": \\"\\", \\"resource_name\\":'
-        ' \\"tf-test VM Instance labels {project_id=tf-test}\\",'
-        ' \\"resource_type_display_name\\": \\"VM Instance\\",'
-        ' \\"started_at\\": 1620754533, \\"state\\": \\"closed\\",'
-        ' \\"summary\\": \\"CPU usage for tf-test VM Instance labels'
-        ' {project_id=tf-test} returned to normal with a value of 0.081.\\",'
-        ' \\"url\\":'
-        ' \\"https://console.cloud.google.com/monitoring/alerting/incidents/0.m2d61b3s6d5d?project=tf-test\\"},'
-        ' \\"version\\": \\"1.2\\"}"}'
+    # The text is the compact json dump of the notification.
+    expected_body = json.dumps(
+        {'text': json.dumps(_NOTIF, separators=(',', ':'))}
     )
     self._http_obj_mock.request.assert_called_with(
-        uri='https://chat.123.com',
+        url='https://chat.123.com',
         method='POST',
         headers={'Content-Type': 'application/json; charset=UTF-8'},
-        body=expected_body,
+        data=mock.ANY,
+        timeout=service_handler._HTTP_TIMEOUT_SEC,
+    )
+    self.assertEqual(
+        _SentJsonBody(self._http_obj_mock), json.loads(expected_body)
     )
 
   def testSendNotificationFormatCardSucceed(self):
     handler = service_handler.GchatHandler()
-    self._http_obj_mock.request.return_value = (
-        httplib2.Response({'status': 200}),
-        b'OK',
-    )
+    self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
     expected_body = json.dumps({
         'cards': [{
             'sections': [{
@@ -236,7 +337,7 @@ class GchatHandlerTest(unittest.TestCase):
                         'textParagraph': {
                             'text': (
                                 '<b><font'
-                                ' color="{header_color}">Summary:</font></b>'
+                                ' color="#0000FF">Summary:</font></b>'
                                 ' CPU usage for tf-test VM Instance labels'
                                 ' {project_id=tf-test} returned to normal with'
                                 ' a value of 0.081., <br><b><font'
@@ -280,19 +381,20 @@ class GchatHandlerTest(unittest.TestCase):
 
     # Ensure the body matches
     self._http_obj_mock.request.assert_called_with(
-        uri='https://chat.123.com',
+        url='https://chat.123.com',
         method='POST',
         headers={'Content-Type': 'application/json; charset=UTF-8'},
-        body=expected_body,
+        data=mock.ANY,
+        timeout=service_handler._HTTP_TIMEOUT_SEC,
+    )
+    self.assertEqual(
+        _SentJsonBody(self._http_obj_mock), json.loads(expected_body)
     )
 
   def testSendNotificationFormatCardFailedDueToMissingField(self):
     missing_fields = ['condition', 'resource', 'url', 'state', 'summary']
     handler = service_handler.GchatHandler()
-    self._http_obj_mock.request.return_value = (
-        httplib2.Response({'status': 200}),
-        b'OK',
-    )
+    self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
     for missing_field in missing_fields:
       notif = copy.deepcopy(_NOTIF)
       del notif['incident'][missing_field]
@@ -300,21 +402,37 @@ class GchatHandlerTest(unittest.TestCase):
       _, status_code = handler.SendNotification(_CONFIG_PARAMS_GCHAT, notif)
       self.assertNotEqual(status_code, 200)
 
+  def testSendNotificationFormatCardWithSeverity(self):
+    handler = service_handler.GchatHandler()
+    notif_with_severity = copy.deepcopy(_NOTIF)
+    notif_with_severity['incident']['policy_user_labels'] = {
+        'severity': 'critical'
+    }
+    self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
+    _, status_code = handler.SendNotification(
+        _CONFIG_PARAMS_GCHAT, notif_with_severity
+    )
+    self.assertEqual(status_code, 200)
+    card = _SentJsonBody(self._http_obj_mock)['cards'][0]
+    summary_text = card['sections'][0]['widgets'][0]['textParagraph']['text']
+    self.assertTrue(
+        summary_text.endswith(
+            ', <br><b><font color="#0000FF">Severity:</font></b> critical'
+        )
+    )
+
   def testSendNotificationFormatCardStartedAtMissing(self):
     handler = service_handler.GchatHandler()
     notif_without_startime = copy.deepcopy(_NOTIF)
     del notif_without_startime['incident']['started_at']
-    self._http_obj_mock.request.return_value = (
-        httplib2.Response({'status': 200}),
-        b'OK',
-    )
+    self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
     http_response, status_code = handler.SendNotification(
         _CONFIG_PARAMS_GCHAT, notif_without_startime
     )
     self.assertEqual(status_code, 200)
     expected_body = (
         '{"cards": [{"sections": [{"widgets": [{"textParagraph": {"text":'
-        ' "<b><font color=\\"{header_color}\\">Summary:</font></b> CPU usage'
+        ' "<b><font color=\\"#0000FF\\">Summary:</font></b> CPU usage'
         ' for '
         'tf-test VM Instance labels {project_id=tf-test} returned to normal'
         ' with a value of 0.081., <br><b><font'
@@ -327,10 +445,14 @@ class GchatHandlerTest(unittest.TestCase):
         ' "https://console.cloud.google.com/monitoring/alerting/incidents/0.m2d61b3s6d5d?project=tf-test"}}}}]}]}]}]}'
     )
     self._http_obj_mock.request.assert_called_with(
-        uri='https://chat.123.com',
+        url='https://chat.123.com',
         method='POST',
         headers={'Content-Type': 'application/json; charset=UTF-8'},
-        body=expected_body,
+        data=mock.ANY,
+        timeout=service_handler._HTTP_TIMEOUT_SEC,
+    )
+    self.assertEqual(
+        _SentJsonBody(self._http_obj_mock), json.loads(expected_body)
     )
 
 
@@ -339,12 +461,22 @@ class MSTeamsHandlerTest(unittest.TestCase):
   def setUp(self):
     super().setUp()
     self._http_obj_mock = mock.Mock()
-    self._http_mock = mock.Mock(return_value=self._http_obj_mock)
-    httplib2.Http = self._http_mock
+    patcher = mock.patch.object(
+        service_handler, '_HTTP_SESSION', self._http_obj_mock
+    )
+    patcher.start()
+    self.addCleanup(patcher.stop)
+    patcher = mock.patch.object(
+        service_handler,
+        '_CIRCUIT_BREAKER',
+        service_handler._CircuitBreaker(fail_max=2, reset_timeout_sec=30),
+    )
+    patcher.start()
+    self.addCleanup(patcher.stop)
 
   def testCheckServiceNameInConfigParamsFailed(self):
     handler = service_handler.MSTeamsHandler()
-    for bad_config in _BAD_CONFIG_PARAMS_TEAMS:
+    for bad_config in _BAD_SERVICE_NAME_CONFIG_PARAMS_TEAMS:
       with self.assertRaises(service_handler.ConfigParamsError):
         handler.CheckServiceNameInConfigParams(bad_config)
 
@@ -378,53 +510,27 @@ class MSTeamsHandlerTest(unittest.TestCase):
     handler = service_handler.MSTeamsHandler()
     config_params = _CONFIG_PARAMS_TEAMS.copy()
     config_params['msg_format'] = 'text'
-    self._http_obj_mock.request.return_value = (
-        httplib2.Response({'status': 200}),
-        b'OK',
-    )
+    self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
     http_response, status_code = handler.SendNotification(config_params, _NOTIF)
     self.assertEqual(status_code, 200)
-    expected_body = (
-        '{"text": "{\\"incident\\": {\\"condition\\":'
-        ' {\\"conditionThreshold\\": {\\"aggregations\\":'
-        ' [{\\"alignmentPeriod\\": \\"60s\\", \\"crossSeriesReducer\\":'
-        ' \\"REDUCE_SUM\\", \\"perSeriesAligner\\": \\"ALIGN_SUM\\"}],'
-        ' \\"comparison\\": \\"COMPARISON_GT\\", \\"duration\\": \\"60s\\",'
-        ' \\"filter\\":'
-        ' \\"metric.type=\\\\\\"compute.googleapis.com/instance/cpu/usage_time\\\\\\"'
-        ' AND resource.type=\\\\\\"gce_instance\\\\\\"\\", \\"trigger\\":'
-        ' {\\"count\\": 1}}, \\"displayName\\": \\"test condition\\",'
-        ' \\"name\\":'
-        ' \\"projects/tf-test/alertPolicies/3528831492076541324/conditions/3528831492076543949\\"},'
-        ' \\"condition_name\\": \\"test condition\\", \\"ended_at\\":'
-        ' 1621359336, \\"incident_id\\": \\"0.m2d61b3s6d5d\\", \\"metric\\":'
-        ' {\\"displayName\\": \\"CPU usage\\", \\"type\\":'
-        ' \\"compute.googleapis.com/instance/cpu/usage_time\\"},'
-        ' \\"policy_name\\": \\"test Alert Policy\\", \\"resource\\":'
-        ' {\\"labels\\": {\\"project_id\\": \\"tf-test\\"}, \\"type\\":'
-        ' \\"gce_instance\\"}, \\"resource_id\\": \\"\\", \\"resource_name\\":'
-        ' \\"tf-test VM Instance labels {project_id=tf-test}\\",'
-        ' \\"resource_type_display_name\\": \\"VM Instance\\",'
-        ' \\"started_at\\": 1620754533, \\"state\\": \\"closed\\",'
-        ' \\"summary\\": \\"CPU usage for tf-test VM Instance labels'
-        ' {project_id=tf-test} returned to normal with a value of 0.081.\\",'
-        ' \\"url\\":'
-        ' \\"https://console.cloud.google.com/monitoring/alerting/incidents/0.m2d61b3s6d5d?project=tf-test\\"},'
-        ' \\"version\\": \\"1.2\\"}"}'
+    # The text is the compact json dump of the notification.
+    expected_body = json.dumps(
+        {'text': json.dumps(_NOTIF, separators=(',', ':'))}
     )
     self._http_obj_mock.request.assert_called_once_with(
-        uri=_CONFIG_PARAMS_TEAMS['webhook_url'],
+        url=_CONFIG_PARAMS_TEAMS['webhook_url'],
         method='POST',
         headers={'Content-Type': 'application/json; charset=UTF-8'},
-        body=expected_body,
+        data=mock.ANY,
+        timeout=service_handler._HTTP_TIMEOUT_SEC,
+    )
+    self.assertEqual(
+        _SentJsonBody(self._http_obj_mock), json.loads(expected_body)
     )
 
   def testSendNotificationFormatCardSucceed(self):
     handler = service_handler.MSTeamsHandler()
-    self._http_obj_mock.request.return_value = (
-        httplib2.Response({'status': 200}),
-        b'OK',
-    )
+    self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
     http_response, status_code = handler.SendNotification(
         _CONFIG_PARAMS_TEAMS, _NOTIF
     )
@@ -467,20 +573,37 @@ class MSTeamsHandlerTest(unittest.TestCase):
     )
 
     self._http_obj_mock.request.assert_called_with(
-        uri=_CONFIG_PARAMS_TEAMS['webhook_url'],
+        url=_CONFIG_PARAMS_TEAMS['webhook_url'],
         method='POST',
         headers={'Content-Type': 'application/json; charset=UTF-8'},
-        body=expected_body,
+        data=mock.ANY,
+        timeout=service_handler._HTTP_TIMEOUT_SEC,
+    )
+    self.assertEqual(
+        _SentJsonBody(self._http_obj_mock), json.loads(expected_body)
+    )
+
+  def testSendNotificationFormatCardEscapesFields(self):
+    handler = service_handler.MSTeamsHandler()
+    notif = copy.deepcopy(_NOTIF)
+    notif['incident']['summary'] = 'Disk "/data" is\nfull {{url}}'
+    notif['incident']['documentation'] = {'content': 'Run "df -h"\\'}
+    self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
+    _, status_code = handler.SendNotification(_CONFIG_PARAMS_TEAMS, notif)
+    self.assertEqual(status_code, 200)
+    body = _SentJsonBody(self._http_obj_mock)
+    card_body = body['attachments'][0]['content']['body']
+    self.assertEqual(
+        card_body[0]['items'][1]['text'], 'Disk "/data" is\nfull {{url}}'
     )
+    details = card_body[1]['actions'][1]['card']['body'][0]['items']
+    self.assertEqual(details[-1]['text'], 'Run "df -h"\\')
 
   def testSendNotificationFormatCardSucceedWithDocumentationAndQuickLinks(self):
     handler = service_handler.MSTeamsHandler()
     notif_without_startime = copy.deepcopy(_NOTIF)
     del notif_without_startime['incident']['started_at']
-    self._http_obj_mock.request.return_value = (
-        httplib2.Response({'status': 200}),
-        b'OK',
-    )
+    self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
     _, status_code = handler.SendNotification(
         _CONFIG_PARAMS_TEAMS, notif_without_startime
     )
@@ -521,10 +644,14 @@ class MSTeamsHandlerTest(unittest.TestCase):
         ' "1.5"}}]}'
     )
     self._http_obj_mock.request.assert_called_once_with(
-        uri=_CONFIG_PARAMS_TEAMS['webhook_url'],
+        url=_CONFIG_PARAMS_TEAMS['webhook_url'],
         method='POST',
         headers={'Content-Type': 'application/json; charset=UTF-8'},
-        body=expected_body,
+        data=mock.ANY,
+        timeout=service_handler._HTTP_TIMEOUT_SEC,
+    )
+    self.assertEqual(
+        _SentJsonBody(self._http_obj_mock), json.loads(expected_body)
     )
 
   def testSendNotificationFormatCardSucceedWithoutDocumentationAndQuickLinks(
@@ -536,10 +663,7 @@ class MSTeamsHandlerTest(unittest.TestCase):
         'content': '',
         'links': [],
     }
-    self._http_obj_mock.request.return_value = (
-        httplib2.Response({'status': 200}),
-        b'OK',
-    )
+    self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
     http_response, status_code = handler.SendNotification(
         _CONFIG_PARAMS_TEAMS, notif_without_docs_links
     )
@@ -581,10 +705,14 @@ class MSTeamsHandlerTest(unittest.TestCase):
         ' "version": "1.5"}}]}'
     )
     self._http_obj_mock.request.assert_called_once_with(
-        uri=_CONFIG_PARAMS_TEAMS['webhook_url'],
+        url=_CONFIG_PARAMS_TEAMS['webhook_url'],
         method='POST',
         headers={'Content-Type': 'application/json; charset=UTF-8'},
-        body=expected_body,
+        data=mock.ANY,
+        timeout=service_handler._HTTP_TIMEOUT_SEC,
+    )
+    self.assertEqual(
+        _SentJsonBody(self._http_obj_mock), json.loads(expected_body)
     )
 
   def testSendNotificationFormatCardSucceedWithOnlyDocumentation(self):
@@ -594,10 +722,7 @@ class MSTeamsHandlerTest(unittest.TestCase):
         'content': 'Some documentation content',
         'links': [],
     }
-    self._http_obj_mock.request.return_value = (
-        httplib2.Response({'status': 200}),
-        b'OK',
-    )
+    self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
     http_response, status_code = handler.SendNotification(
         _CONFIG_PARAMS_TEAMS, notif_with_docs_only
     )
@@ -642,10 +767,14 @@ class MSTeamsHandlerTest(unittest.TestCase):
         ' "version": "1.5"}}]}'
     )
     self._http_obj_mock.request.assert_called_once_with(
-        uri=_CONFIG_PARAMS_TEAMS['webhook_url'],
+        url=_CONFIG_PARAMS_TEAMS['webhook_url'],
         method='POST',
         headers={'Content-Type': 'application/json; charset=UTF-8'},
-        body=expected_body,
+        data=mock.ANY,
+        timeout=service_handler._HTTP_TIMEOUT_SEC,
+    )
+    self.assertEqual(
+        _SentJsonBody(self._http_obj_mock), json.loads(expected_body)
     )
 
   def testSendNotificationFormatCardSucceedWithOnlyQuickLinks(self):
@@ -658,10 +787,7 @@ class MSTeamsHandlerTest(unittest.TestCase):
             {'DisplayName': 'playbook updated3', 'URL': 'https://google.com'},
         ],
     }
-    self._http_obj_mock.request.return_value = (
-        httplib2.Response({'status': 200}),
-        b'OK',
-    )
+    self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
     http_response, status_code = handler.SendNotification(
         _CONFIG_PARAMS_TEAMS, notif_with_links_only
     )
@@ -705,19 +831,20 @@ class MSTeamsHandlerTest(unittest.TestCase):
         ' "version": "1.5"}}]}'
     )
     self._http_obj_mock.request.assert_called_once_with(
-        uri='https://outlook.office.com/webhook/.../IncomingWebhook/...',
+        url='https://outlook.office.com/webhook/.../IncomingWebhook/...',
         method='POST',
         headers={'Content-Type': 'application/json; charset=UTF-8'},
-        body=expected_body,
+        data=mock.ANY,
+        timeout=service_handler._HTTP_TIMEOUT_SEC,
+    )
+    self.assertEqual(
+        _SentJsonBody(self._http_obj_mock), json.loads(expected_body)
     )
 
   def testSendNotificationWithEmptyIncident(self):
     handler = service_handler.MSTeamsHandler()
     notif_empty_incident = {'incident': {}}
-    self._http_obj_mock.request.return_value = (
-        httplib2.Response({'status': 200}),
-        b'OK',
-    )
+    self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
     http_response, status_code = handler.SendNotification(
         _CONFIG_PARAMS_TEAMS, notif_empty_incident
     )
@@ -755,10 +882,14 @@ class MSTeamsHandlerTest(unittest.TestCase):
         ' "1.5"}}]}'
     )
     self._http_obj_mock.request.assert_called_once_with(
-        uri='https://outlook.office.com/webhook/.../IncomingWebhook/...',
+        url='https://outlook.office.com/webhook/.../IncomingWebhook/...',
         method='POST',
         headers={'Content-Type': 'application/json; charset=UTF-8'},
-        body=expected_body,
+        data=mock.ANY,
+        timeout=service_handler._HTTP_TIMEOUT_SEC,
+    )
+    self.assertEqual(
+        _SentJsonBody(self._http_obj_mock), json.loads(expected_body)
     )
 
   def testSendNotificationWithOnlyRequiredFields(self):
@@ -771,10 +902,7 @@ class MSTeamsHandlerTest(unittest.TestCase):
             'url': 'https://test.url',
         }
     }
-    self._http_obj_mock.request.return_value = (
-        httplib2.Response({'status': 200}),
-        b'OK',
-    )
+    self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
     http_response, status_code = handler.SendNotification(
         _CONFIG_PARAMS_TEAMS, notif_only_required
     )
@@ -812,19 +940,20 @@ class MSTeamsHandlerTest(unittest.TestCase):
         ' "version": "1.5"}}]}'
     )
     self._http_obj_mock.request.assert_called_once_with(
-        uri='https://outlook.office.com/webhook/.../IncomingWebhook/...',
+        url='https://outlook.office.com/webhook/.../IncomingWebhook/...',
         method='POST',
         headers={'Content-Type': 'application/json; charset=UTF-8'},
-        body=expected_body,
+        data=mock.ANY,
+        timeout=service_handler._HTTP_TIMEOUT_SEC,
+    )
+    self.assertEqual(
+        _SentJsonBody(self._http_obj_mock), json.loads(expected_body)
     )
 
   def testSendNotificationFormatCardStillSucceedWithMissingRequiredField(self):
     required_fields = ['condition_name', 'summary', 'state', 'url']
     handler = service_handler.MSTeamsHandler()
-    self._http_obj_mock.request.return_value = (
-        httplib2.Response({'status': 200}),
-        b'OK',
-    )
+    self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
     for required_field in required_fields:
       notif = copy.deepcopy(_NOTIF)
       del notif['incident'][required_field]
@@ -838,10 +967,7 @@ class MSTeamsHandlerTest(unittest.TestCase):
     for severity in severity_levels:
       notif_with_severity = copy.deepcopy(_NOTIF)
       notif_with_severity['incident']['severity'] = severity
-      self._http_obj_mock.request.return_value = (
-          httplib2.Response({'status': 200}),
-          b'OK',
-      )
+      self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
       http_response, status_code = handler.SendNotification(
           _CONFIG_PARAMS_TEAMS, notif_with_severity
       )
@@ -857,10 +983,7 @@ class MSTeamsHandlerTest(unittest.TestCase):
     notif_with_special_chars['incident']['resource']['labels'].update(
         {'special_label': '<b>bold</b>'}
     )
-    self._http_obj_mock.request.return_value = (
-        httplib2.Response({'status': 200}),
-        b'OK',
-    )
+    self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
     http_response, status_code = handler.SendNotification(
         _CONFIG_PARAMS_TEAMS, notif_with_special_chars
     )
@@ -873,10 +996,7 @@ class MSTeamsHandlerTest(unittest.TestCase):
     for state in incident_states:
       notif_with_state = copy.deepcopy(_NOTIF)
       notif_with_state['incident']['state'] = state
-      self._http_obj_mock.request.return_value = (
-          httplib2.Response({'status': 200}),
-          b'OK',
-      )
+      self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
       http_response, status_code = handler.SendNotification(
           _CONFIG_PARAMS_TEAMS, notif_with_state
       )
@@ -889,10 +1009,7 @@ class MSTeamsHandlerTest(unittest.TestCase):
     notif_with_many_labels['incident']['resource']['labels'].update(
         {f'label_{i}': f'value_{i}' for i in range(100)}
     )
-    self._http_obj_mock.request.return_value = (
-        httplib2.Response({'status': 200}),
-        b'OK',
-    )
+    self._http_obj_mock.request.return_value = _HttpResponse(200, b'OK')
     http_response, status_code = handler.SendNotification(
         _CONFIG_PARAMS_TEAMS, notif_with_many_labels
     )
@@ -33,6 +33,9 @@ resource "google_cloud_run_service" "cloud_run_pubsub_service" {
 
   template {
     spec {
+      # Matches the number of gunicorn threads in the container so that
+      # Cloud Run does not queue requests the server could serve concurrently.
+      container_concurrency = 80
       containers {
         image = "gcr.io/${var.project_id}/cloud-run-pubsub-service:latest"
       }